@@ -6,6 +6,8 @@ import re
 from typing import List
 from operator import itemgetter
 import logging
+import math
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout, as_completed
 
 # Third-party library imports
 import fitz  # PyMuPDF
@@ -13,7 +15,13 @@ from dotenv import load_dotenv
 import pandas as pd 
 
 from google import genai
-from google.genai.types import GenerateContentConfig, ThinkingConfig
+from google.genai.types import GenerateContentConfig, HttpOptions, ThinkingConfig
+
+from backend.feature.file_cache import sha256_file
+from backend.feature.llm_cache import llm_cache
+from backend.feature.doc_format import DOC_SUFFIX, JSON_EXPORT, export_json, write_document
+from backend.feature.doc_index import get_document_index
+from backend.feature.retrieval import section_snippet
 
 # from vertexai.generative_models import GenerativeModel, GenerationConfig
 
@@ -32,6 +40,19 @@ except FileNotFoundError:
 
 model_name = os.getenv("GEMINI_MODEL")
 
+# How find_relevant_sections picks candidate headings:
+#   "llm"  - one Gemini filtering call per document (process_headings)
+#   "bm25" - local BM25 over headings + section text, one pass across all documents
+#   "vector" - no LLM at all: TF-IDF cosine ranking, section openings instead of summaries
+RELEVANCE_MODES = ("llm", "bm25", "vector")
+RELEVANCE_MODE = os.getenv("RELEVANCE_MODE", "llm")
+BM25_CANDIDATES = int(os.getenv("BM25_CANDIDATES", 12))
+VECTOR_TOP_K = int(os.getenv("VECTOR_TOP_K", 4))
+
+# Independent Gemini calls (per-document filters, per-heading summaries) run concurrently
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", 8))
+GEMINI_CALL_TIMEOUT_SECONDS = int(os.getenv("GEMINI_CALL_TIMEOUT_SECONDS", 60))
+
 client = genai.Client(
     vertexai=True, project=project_id, location=location
 )
@@ -39,15 +60,26 @@ client = genai.Client(
 
 # --- PDF Parsing and Text Extraction Functions ---
 
+# Bump whenever the parser's output changes so cached results from older parsers are not reused.
+PARSER_VERSION = "2"
+
 def pdf_to_dict(path):
     """
     Main function to process a PDF file and extract its title, potential headings,
     and full text content.
     """
     doc = fitz.open(path)
-    font_counts, styles = fonts(doc, granularity=True)
+    # Single pass over the pages: every later stage works from these records
+    return pages_to_dict(extract_pages(doc), reference_page_height(doc))
+
+def pages_to_dict(pages, page_height):
+    """
+    Turns extracted page records (from one pass or from merged page-range shards) into the
+    title, potential headings and full text. Font statistics are always computed over all pages.
+    """
+    font_counts, styles = fonts(pages)
     size_tag = font_tags(font_counts, styles)
-    elements, list_of_text = headers_para(doc, size_tag)
+    elements, list_of_text = headers_para(pages, size_tag, page_height)
 
     final = []
     for ele in elements:
@@ -73,20 +105,63 @@ def relative_borderdistance(list_of_bboxes, x_page, y_page, whole_page=True):
     df_bboxes_sorted = pd.DataFrame(list_of_bboxlists, columns=column_names).sort_values(by=['y_sort', 'x_sort'])
     return df_bboxes_sorted['entry_count'].to_list()
 
-def fonts(doc, granularity):
-    """Extracts font styles and counts their usage."""
+def extract_pages(doc, page_numbers=None):
+    """
+    Walks each page once with get_text("dict") and returns one record per page holding
+    the font usage (for fonts) and the non-empty spans in reading order (for headers_para).
+    """
+    pages = []
+    for page_num in (range(len(doc)) if page_numbers is None else page_numbers):
+        page = doc[page_num]
+        blocks = page.get_text("dict", flags=11)["blocks"]
+        text_blocks = [b for b in blocks if b['type'] == 0]
+
+        # Font usage is counted in extraction order so ties rank exactly as before
+        styles, font_counts = {}, {}
+        for b in text_blocks:
+            for l in b["lines"]:
+                for s in l["spans"]:
+                    identifier = f"{s['size']}{s['flags']}{s['font']}_{s['color']}"
+                    styles[identifier] = {'size': s['size'], 'flags': s['flags'], 'font': s['font'], 'color': s['color']}
+                    font_counts[identifier] = font_counts.get(identifier, 0) + 1
+
+        spans = []
+        if text_blocks:
+            bboxes_ordered = relative_borderdistance([b['bbox'] for b in text_blocks], page.rect.width, page.rect.height)
+            for b_index in bboxes_ordered:
+                for line in text_blocks[b_index]["lines"]:
+                    for span in line["spans"]:
+                        if span['text'].strip():
+                            spans.append({
+                                'font_label': f"{span['size']}{span['flags']}{span['font']}_{span['color']}",
+                                'text': span['text'], 'p_position_y': span['origin'][1],
+                                'bbox': span['bbox'], 'font_size': span['size']
+                            })
+
+        pages.append({
+            'page_num': page_num, 'has_text': bool(text_blocks),
+            'styles': styles, 'font_counts': font_counts, 'spans': spans
+        })
+    return pages
+
+def extract_page_range(path, start, stop):
+    """Opens the PDF independently and extracts only pages [start, stop); used by sharded parsing."""
+    doc = fitz.open(path)
+    return extract_pages(doc, range(start, min(stop, len(doc))))
+
+def reference_page_height(doc):
+    """Height used for the header/footer bands (the last page's, as the parser has always done)."""
+    return doc[-1].rect.height if len(doc) else 0
+
+def fonts(pages):
+    """Extracts font styles and counts their usage from the extracted page records."""
     styles = {}
     font_counts = {}
-    for page in doc:
-        blocks = page.get_text("dict", flags=11)["blocks"]
-        for b in blocks:
-            if b['type'] == 0:  # Text block
-                for l in b["lines"]:
-                    for s in l["spans"]:
-                        identifier = f"{s['size']}{s['flags']}{s['font']}_{s['color']}"
-                        styles[identifier] = {'size': s['size'], 'flags': s['flags'], 'font': s['font'], 'color': s['color']}
-                        font_counts[identifier] = font_counts.get(identifier, 0) + 1
-    
+    for page in pages:
+        styles.update(page['styles'])
+        for identifier, count in page['font_counts'].items():
+            font_counts[identifier] = font_counts.get(identifier, 0) + count
+
     font_counts = sorted(font_counts.items(), key=itemgetter(1), reverse=True)
     if not font_counts:
         raise ValueError("Zero discriminating fonts found!")
@@ -113,28 +188,19 @@ def font_tags(font_counts, styles):
         app_tag[style_id] = f"<h{i + 1}>"
     return app_tag
 
-def headers_para(doc, size_tag):
+def headers_para(pages, size_tag, page_height):
     """Extracts and merges text elements, filtering out headers/footers."""
     header_para, text_list = [], []
-    for page_num, page in enumerate(doc):
-        blocks = page.get_text("dict", flags=11)["blocks"]
-        text_blocks = [b for b in blocks if b['type'] == 0]
-        if not text_blocks: continue
+    for page in pages:
+        if not page['has_text']: continue
 
-        bboxes_ordered = relative_borderdistance([b['bbox'] for b in text_blocks], page.rect.width, page.rect.height)
-        
         page_text = ""
-        for b_index in bboxes_ordered:
-            block = text_blocks[b_index]
-            for line in block["lines"]:
-                for span in line["spans"]:
-                    font_label = f"{span['size']}{span['flags']}{span['font']}_{span['color']}"
-                    if span['text'].strip():
-                        header_para.append({
-                            'tag': size_tag.get(font_label, "<p>"), 'text': span['text'], 'page_num': page_num,
-                            'p_position_y': span['origin'][1], 'bbox': span['bbox'], 'font_size': span['size']
-                        })
-                        page_text += span['text'] + " "
+        for span in page['spans']:
+            header_para.append({
+                'tag': size_tag.get(span['font_label'], "<p>"), 'text': span['text'], 'page_num': page['page_num'],
+                'p_position_y': span['p_position_y'], 'bbox': span['bbox'], 'font_size': span['font_size']
+            })
+            page_text += span['text'] + " "
         text_list.append(page_text.strip())
 
     merged_elements = []
@@ -142,7 +208,7 @@ def headers_para(doc, size_tag):
     while i < len(header_para):
         current_elem = header_para[i]
         # Filter out headers (top 5%) and footers (bottom 10%)
-        if current_elem['p_position_y'] < (page.rect.height * 0.05) or current_elem['p_position_y'] > (page.rect.height * 0.9):
+        if current_elem['p_position_y'] < (page_height * 0.05) or current_elem['p_position_y'] > (page_height * 0.9):
             i += 1
             continue
         merged_elements.append(current_elem)
@@ -155,9 +221,54 @@ def find_primary_heading(block_strings):
     page_0_blocks = sorted([b for b in block_strings if b['page_num'] == 0], key=lambda x: x.get('font_size', 0), reverse=True)
     return page_0_blocks[0] if page_0_blocks else None
 
-def create_output_json(pdf_path, output_dir):
-    """Creates a structured JSON file from a PDF's content."""
-    title, heading_blocks, list_of_text = pdf_to_dict(pdf_path)
+def parse_cache_key(pdf_path):
+    return f"{sha256_file(pdf_path)}-v{PARSER_VERSION}"
+
+def parsed_document_path(output_dir, pdf_name):
+    """Where the parsed form of pdf_name lives inside a temp_files folder."""
+    return Path(output_dir) / f"{Path(pdf_name).stem}{DOC_SUFFIX}"
+
+def create_output_json(pdf_path, output_dir, cache=None, parse=pdf_to_dict):
+    """
+    Creates the structured parsed document (.pdoc; see doc_format) from a PDF's content.
+    With a FileCache, PDFs already parsed (by any session) are linked from the cache instead of re-parsed.
+    """
+    output_filepath = parsed_document_path(output_dir, pdf_path)
+    if cache is None:
+        write_output_json(pdf_path, output_filepath, parse)
+        return export_debug_json(output_filepath)
+
+    key = parse_cache_key(pdf_path)
+    if cache.get(key) and cache.link_into(key, output_filepath):
+        print(f"info - Parse cache hit for {Path(pdf_path).name} {cache.stats()}")
+        return export_debug_json(output_filepath)
+
+    tmp_path = cache.temp_path()
+    try:
+        write_output_json(pdf_path, tmp_path, parse)
+        cache.put(key, tmp_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+    if not cache.link_into(key, output_filepath):
+        # Evicted straight away (cache smaller than this one entry); parse directly instead
+        write_output_json(pdf_path, output_filepath, parse)
+    print(f"info - Parse cache miss for {Path(pdf_path).name} {cache.stats()}")
+    return export_debug_json(output_filepath)
+
+def export_debug_json(output_filepath):
+    if JSON_EXPORT:
+        export_json(output_filepath)
+    return output_filepath
+
+def write_output_json(pdf_path, output_filepath, parse=pdf_to_dict):
+    """Parses the PDF and writes {title, outline, full_text} to output_filepath."""
+    # write_document writes-then-renames: the target may be a hard link into the parse cache,
+    # which must never be truncated in place
+    return write_document(output_filepath, build_output_data(*parse(pdf_path)))
+
+def build_output_data(title, heading_blocks, list_of_text):
+    """Shapes pdf_to_dict's result into the intermediate JSON document."""
     outline = []
     for block in heading_blocks:
         text = block['text'].strip()
@@ -166,75 +277,119 @@ def create_output_json(pdf_path, output_dir):
                 "text": text, "page": block['page_num'], 'top_x': block['bbox'][0],
                 'top_y': block['bbox'][1], 'bot_x': block['bbox'][2], 'bot_y': block['bbox'][3]
             })
-    output_data = {"title": title, "outline": outline, 'full_text': list_of_text}
-    output_filepath = Path(output_dir) / f"{Path(pdf_path).stem}.json"
-    with open(output_filepath, 'w', encoding='utf-8') as f:
-        json.dump(output_data, f, indent=2, ensure_ascii=False)
-    return output_filepath
+    return {"title": title, "outline": outline, 'full_text': list_of_text}
 
-def call_gemini_api(system_prompt, user_prompt):
+def iter_concurrently(func, args_list, max_workers=None, timeout=None):
+    """
+    Calls func(*args) for every args tuple on a bounded thread pool and yields (position, result)
+    as each call finishes. Each call is also bounded by the request timeout in its own config;
+    a call that raises or is still running at the batch deadline yields None instead of
+    holding up the others.
+    """
+    args_list = list(args_list)
+    if not args_list:
+        return
+    max_workers = min(max_workers or GEMINI_MAX_CONCURRENCY, len(args_list))
+    timeout = timeout or GEMINI_CALL_TIMEOUT_SECONDS
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gemini")
+    futures = {executor.submit(func, *args): position for position, args in enumerate(args_list)}
+    pending = set(futures.values())
+    # Calls queue behind the concurrency limit, so the batch deadline allows one timeout per wave
+    deadline = timeout * math.ceil(len(futures) / max_workers) + 5
+    try:
+        for future in as_completed(futures, timeout=deadline):
+            position = futures[future]
+            pending.discard(position)
+            if future.exception() is not None:
+                logging.error(f"Gemini call failed: {future.exception()}")
+                yield position, None
+            else:
+                yield position, future.result()
+    except FuturesTimeout:
+        for position in sorted(pending):
+            logging.error(f"Gemini call timed out after {timeout}s")
+            yield position, None
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def run_concurrently(func, args_list, max_workers=None, timeout=None):
+    """Like iter_concurrently, but returns every result at once, in input order."""
+    args_list = list(args_list)
+    results = [None] * len(args_list)
+    for position, result in iter_concurrently(func, args_list, max_workers, timeout):
+        results[position] = result
+    return results
+
+def generate_text(prompt, config, use_cache=True, accept=None):
+    """
+    Sends one prompt to Gemini and returns the response text, served from the shared LLM cache when possible.
+    Responses rejected by accept(response) (ones the caller cannot parse) are not cached.
+    """
+    return llm_cache.cached_call(
+        model_name, config, prompt,
+        lambda: client.models.generate_content(model=model_name, contents=prompt, config=config).text,
+        bypass=not use_cache, accept=accept,
+    )
+
+def parse_list_response(raw_text):
+    """The first Python list in a response (even inside a markdown block), or None if there is none."""
+    # Use regex to find the first string that looks like a Python list '[...]'
+    match = re.search(r'\[.*\]', raw_text or "", re.DOTALL)
+    if not match:
+        return None
+    try:
+        # Safely evaluate the string into a Python list
+        parsed = ast.literal_eval(match.group(0))
+    except (ValueError, SyntaxError, MemoryError, RecursionError, TypeError):
+        return None
+    return parsed if isinstance(parsed, list) else None
+
+def call_gemini_api(system_prompt, user_prompt, use_cache=True):
     """
     Calls the Gemini API and robustly parses the list from the response,
     even if it's inside a markdown block.
     """
     full_prompt = f"{system_prompt}\n\n{user_prompt}"
+    raw_text = None
     try:
-        response = client.models.generate_content(
-            model= model_name,
-            contents=full_prompt,
-            config=GenerateContentConfig(
-                thinking_config=ThinkingConfig(thinking_budget = 0)
-            )
+        raw_text = generate_text(
+            full_prompt,
+            GenerateContentConfig(
+                thinking_config=ThinkingConfig(thinking_budget = 0),
+                http_options=HttpOptions(timeout=GEMINI_CALL_TIMEOUT_SECONDS * 1000)
+            ),
+            use_cache=use_cache,
+            accept=lambda response: parse_list_response(response) is not None,
         )
-        raw_text = response.text
-
-        # Use regex to find the first string that looks like a Python list '[...]'
-        match = re.search(r'\[.*\]', raw_text, re.DOTALL)
 
-        if match:
-            # If a match is found, extract it
-            list_string = match.group(0)
-            # Safely evaluate the string into a Python list
-            return ast.literal_eval(list_string)
-        else:
+        parsed = parse_list_response(raw_text)
+        if parsed is None:
             # If no list is found in the response, log it and return empty
             logging.warning(f"Could not find a list in Gemini response. Raw response:\n{raw_text}")
             return []
+        return parsed
 
     except Exception as e:
         # Catch any other errors during parsing or API call
-        logging.error(f"Error parsing Gemini response: {e}\nRaw response:\n{response.text if 'response' in locals() else 'No response object'}")
+        logging.error(f"Error parsing Gemini response: {e}\nRaw response:\n{raw_text if raw_text is not None else 'No response object'}")
         return []
 
-def load_files(json_folder):
-    """Loads heading data from the intermediate JSON files."""
-    json_files = {f.stem: f for f in Path(json_folder).glob("*.json")}
-    data = []
-    for name, json_path in json_files.items():
-        try:
-            with open(json_path, 'r', encoding='utf-8') as file:
-                json_data = json.load(file)
-                outline_text = [item['text'] for item in json_data.get('outline', [])]
-                data.append(outline_text)
-        except Exception as e:
-            logging.error(f"Error processing {name}: {e}")
-    print(f"Loaded heading data for {len(data)} documents.")
-    return data
-
-def extract_keywords_and_info(text):
+def extract_keywords_and_info(text, use_cache=True):
     """Extract keywords and important info from text using Gemini API."""
     prompt = f'Extract the most important keywords and key information from this text. Return only a single line of comma-separated values.\nText: "{text}"'
     try:
         # generation_config = GenerationConfig(thinking_budget=0, temperature=0.2)
-        response = client.models.generate_content(
-            model= model_name,
-            contents=prompt,
-            config=GenerateContentConfig(
+        response = generate_text(
+            prompt,
+            GenerateContentConfig(
                 temperature=0.2,
-                thinking_config=ThinkingConfig(thinking_budget = 0)
-            )
+                thinking_config=ThinkingConfig(thinking_budget = 0),
+                http_options=HttpOptions(timeout=GEMINI_CALL_TIMEOUT_SECONDS * 1000)
+            ),
+            use_cache=use_cache,
         )
-        return response.text.strip()
+        return response.strip()
     except Exception as e:
         logging.error(f"Error extracting keywords: {e}")
         return ""
@@ -243,67 +398,60 @@ def process_headings(data, keywords):
     """Filters headings from multiple documents using the Gemini API."""
     ordered_headings = []
     system_prompt = "You are a precise filtering assistant. Given keywords and a list of document headings, return only the headings that are highly relevant to the keywords. Select a maximum of 3 headings. Output must be a Python list of strings with only the original headings."
-    for doc_headings in data:
-        if not doc_headings: continue
-        user_prompt = f"Keywords: {keywords}\n\nList of headings: {str(doc_headings)}"
-        result = call_gemini_api(system_prompt, user_prompt)
+    # One call per document, all in flight at once; results are merged in document order
+    user_prompts = [f"Keywords: {keywords}\n\nList of headings: {str(doc_headings)}" for doc_headings in data if doc_headings]
+    for result in run_concurrently(call_gemini_api, [(system_prompt, user_prompt) for user_prompt in user_prompts]):
         if result:
             ordered_headings.extend(result)
     return ordered_headings
 
-def extract_relevant_info(heading, document_page):
+SUMMARY_FAILED_PREFIX = "Could not summarize: "
+
+def extract_relevant_info(heading, document_page, use_cache=True):
     """Summarizes a page section related to a specific heading using the Gemini API."""
     prompt = f'Summarize information related to the heading "{heading}" from the following text in 2-3 concise sentences.\n\nDocument Text:\n{document_page}'
     try:
-        response = client.models.generate_content(
-            model= model_name,
-            contents=prompt,
-            config=GenerateContentConfig(
-                thinking_config=ThinkingConfig(thinking_budget = 0)
-            )
-        )  
-        return response.text.strip()
+        response = generate_text(
+            prompt,
+            GenerateContentConfig(
+                thinking_config=ThinkingConfig(thinking_budget = 0),
+                http_options=HttpOptions(timeout=GEMINI_CALL_TIMEOUT_SECONDS * 1000)
+            ),
+            use_cache=use_cache,
+        )
+        return response.strip()
     except Exception as e:
         logging.error(f"Error during summarization for heading '{heading}': {e}")
-        return f"Could not summarize: {heading}"
+        return f"{SUMMARY_FAILED_PREFIX}{heading}"
 
-def extract_relevant_info_for_all(final_sorted_list, json_folder, input_dir, curr_dir):
-    """Gathers summaries, page numbers, and paths for the final list of headings using robust pathlib."""
-    heading_set = set(final_sorted_list)
-    json_folder_path, input_dir_path, curr_dir_path = Path(json_folder), Path(input_dir), Path(curr_dir)
-    json_files = {f.stem: f for f in json_folder_path.glob("*.json")}
+def locate_headings(final_sorted_list, index):
+    """Documents, paths, page numbers and bboxes of the final headings from the index; summaries start empty."""
     summaries, page_numbers, doc_names, location, doc_paths = {}, {}, {}, {}, {}
-
-    for name, json_path in json_files.items():
-        pdf_filename = json_path.with_suffix('.pdf').name
-        pdf_path_in_past = input_dir_path / pdf_filename
-        pdf_path_in_current = curr_dir_path / pdf_filename
-
-        source_pdf_path = None
-        if pdf_path_in_past.exists():
-            source_pdf_path = str(pdf_path_in_past)
-        elif pdf_path_in_current.exists():
-            source_pdf_path = str(pdf_path_in_current)
-        else:
-            logging.warning(f"PDF file not found for {json_path.name}. Looked in {pdf_path_in_past} and {pdf_path_in_current}")
+    for curr_heading in dict.fromkeys(final_sorted_list):
+        entry = index.headings.get(curr_heading)
+        if entry is None:
             continue
+        doc_names[curr_heading] = entry["document"]
+        doc_paths[curr_heading] = entry["local_path"]
+        page_numbers[curr_heading] = entry["page_number"]
+        location[curr_heading] = entry["location"]
+        summaries[curr_heading] = ""
+    return summaries, page_numbers, doc_names, location, doc_paths
+
+def iter_relevant_info(headings, index):
+    """Summarizes the headings concurrently, yielding (heading, summary) in the order the summaries finish."""
+    # Only the one page needed is read from each document body
+    to_summarize = [(heading, index.page_text(heading)) for heading in headings if index.headings[heading]["has_page"]]
+    for position, summary in iter_concurrently(extract_relevant_info, to_summarize):
+        heading = to_summarize[position][0]
+        yield heading, summary if summary is not None else f"{SUMMARY_FAILED_PREFIX}{heading}"
 
-        with open(json_path, 'r', encoding='utf-8') as file:
-            data = json.load(file)
-            for item in data.get('outline', []):
-                curr_heading = item['text'].strip()
-                if curr_heading in heading_set:
-                    doc_names[curr_heading] = os.path.basename(source_pdf_path)
-                    doc_paths[curr_heading] = source_pdf_path
-                    page_number = item['page']
-                    page_numbers[curr_heading] = page_number
-                    location[curr_heading] = [item['top_x'], item['top_y'], item['bot_x'], item['bot_y']]
-                    
-                    full_text = data.get('full_text', [])
-                    if 0 <= page_number < len(full_text):
-                        summaries[curr_heading] = extract_relevant_info(curr_heading, full_text[page_number])
-                    else:
-                        summaries[curr_heading] = ""
+def extract_relevant_info_for_all(final_sorted_list, json_folder, input_dir, curr_dir):
+    """Gathers summaries, page numbers, and paths for the final list of headings from the session's document index."""
+    index = get_document_index(json_folder, input_dir, curr_dir)
+    summaries, page_numbers, doc_names, location, doc_paths = locate_headings(final_sorted_list, index)
+    for curr_heading, summary in iter_relevant_info(summaries, index):
+        summaries[curr_heading] = summary
     return summaries, page_numbers, doc_names, location, doc_paths
 
 def create_travel_plan_json(final_sorted_list, summary, page_numbers, doc_names, locat, doc_paths):
@@ -318,24 +466,85 @@ def create_travel_plan_json(final_sorted_list, summary, page_numbers, doc_names,
             })
     return {"extracted_sections": extracted_sections}
 
-def main_functionality(json_folder, text, input_dir, curr_dir):
-    """Main function to process folders and generate ranked headings using Gemini API."""
-    print("\n1: Turning text into keywords...")
-    keywords = extract_keywords_and_info(text)
-    if not keywords:
-        print("Could not extract keywords from text. Halting.")
+def is_complete_result(result_data):
+    """True if the result has sections and none of their summaries failed, i.e. it is worth caching."""
+    sections = (result_data or {}).get("extracted_sections") or []
+    return bool(sections) and not any(section.get("refined_text", "").startswith(SUMMARY_FAILED_PREFIX) for section in sections)
+
+def rank_by_similarity(index, text, top_k=None):
+    """No-LLM fast path: ranks headings by cosine similarity to the selected text in one matrix-vector product."""
+    top_k = VECTOR_TOP_K if top_k is None else top_k
+    final_sorted_list = [heading for heading, _ in index.vectors().top_n(text, top_k)]
+    if not final_sorted_list:
+        print("No similar headings were found.")
         return None
 
-    data = load_files(json_folder)
+    summaries, page_numbers, doc_names, locat, doc_paths = {}, {}, {}, {}, {}
+    for heading in final_sorted_list:
+        entry = index.headings[heading]
+        body = entry["section_text"]
+        summaries[heading] = section_snippet(body[len(heading):] if body.startswith(heading) else body)
+        page_numbers[heading] = entry["page_number"]
+        doc_names[heading] = entry["document"]
+        locat[heading] = entry["location"]
+        doc_paths[heading] = entry["local_path"]
+    return create_travel_plan_json(final_sorted_list, summaries, page_numbers, doc_names, locat, doc_paths)
+
+def main_functionality(json_folder, text, input_dir, curr_dir, mode=None):
+    """Main function to process folders and generate ranked headings using Gemini API."""
+    result = None
+    for event, data in stream_relevant_sections(json_folder, text, input_dir, curr_dir, mode=mode):
+        if event == "done":
+            result = data
+    return result
+
+def stream_relevant_sections(json_folder, text, input_dir, curr_dir, mode=None):
+    """
+    The find_relevant_sections pipeline as a generator of (event, data) pairs, one per finished stage:
+    "keywords", "candidates", "sections" (the ranked sections with document, page_number and location;
+    refined_text still empty), one "summary" per section as its summary arrives, and finally "done"
+    with the complete result (None if nothing relevant was found).
+    """
+    mode = mode or RELEVANCE_MODE
+    if mode not in RELEVANCE_MODES:
+        raise ValueError(f"Unknown relevance mode '{mode}', expected one of {RELEVANCE_MODES}")
+
+    index = get_document_index(json_folder, input_dir, curr_dir)
+    data = index.outline_lists()
+    print(f"Loaded heading data for {len(data)} documents.")
     if not data:
         print("No source documents found to process!")
-        return None
+        yield "done", None
+        return
 
-    print("\n2: Filtering relevant headings from each document...")
-    ranked_headings = process_headings(data, keywords)
+    if mode == "vector":
+        result = rank_by_similarity(index, text)
+        if result:
+            yield "sections", result
+        yield "done", result
+        return
+
+    if mode == "bm25":
+        # The selection itself is the query; no keyword or per-document filtering calls
+        keywords = text
+        print(f"\n1-2: Selecting top {BM25_CANDIDATES} candidate headings with BM25...")
+        ranked_headings = index.bm25().top_n(text, BM25_CANDIDATES)
+    else:
+        print("\n1: Turning text into keywords...")
+        keywords = extract_keywords_and_info(text)
+        if not keywords:
+            print("Could not extract keywords from text. Halting.")
+            yield "done", None
+            return
+        yield "keywords", {"keywords": keywords}
+
+        print("\n2: Filtering relevant headings from each document...")
+        ranked_headings = process_headings(data, keywords)
     if not ranked_headings:
         print("No relevant headings were found after initial filtering.")
-        return None
+        yield "done", None
+        return
+    yield "candidates", {"count": len(ranked_headings)}
 
     system_prompt = "You are a precise sorting assistant. Given keywords and a list of pre-filtered headings, sort the list in descending order of importance based on the keywords. Select a maximum of 4 headings. Output must be a Python list of strings containing only the original headings."
     user_prompt = f"Keywords: {keywords}\n\nList of headings: {str(ranked_headings)}"
@@ -344,14 +553,21 @@ def main_functionality(json_folder, text, input_dir, curr_dir):
 
     if not final_sorted_list:
         print("No headings remained after the final ranking.")
-        return None
+        yield "done", None
+        return
     print(f"Final sorted list of headings: {final_sorted_list}")
 
+    # Locations go out before any summary exists, so the viewer can highlight right away
+    summaries, page_numbers, doc_names, locat, doc_paths = locate_headings(final_sorted_list, index)
+    yield "sections", create_travel_plan_json(final_sorted_list, summaries, page_numbers, doc_names, locat, doc_paths)
+
     print("\n4: Summarizing content for final headings...")
-    summaries, page_numbers, doc_names, locat, doc_paths = extract_relevant_info_for_all(final_sorted_list, json_folder, input_dir, curr_dir)
-    
-    return create_travel_plan_json(final_sorted_list, summaries, page_numbers, doc_names, locat, doc_paths)
+    ranks = {heading: rank for rank, heading in reversed(list(enumerate(final_sorted_list, start=1)))}
+    for heading, summary in iter_relevant_info(summaries, index):
+        summaries[heading] = summary
+        yield "summary", {"section_title": heading, "importance_rank": ranks[heading], "refined_text": summary}
 
+    yield "done", create_travel_plan_json(final_sorted_list, summaries, page_numbers, doc_names, locat, doc_paths)
 
 
 
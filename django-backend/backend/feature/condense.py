@@ -0,0 +1,166 @@
+import os
+import re
+import math
+from collections import Counter
+
+from backend.feature.doc_index import section_texts
+from backend.feature.retrieval import tokenize
+
+# Default prompt budget (tokens of document material) for the podcast script and condensed insights
+CONDENSE_TOKEN_BUDGET = int(os.getenv("CONDENSE_TOKEN_BUDGET", 6000))
+# Sentences shorter than this (in words) are headings, captions or list debris, not content
+MIN_SENTENCE_WORDS = 5
+
+# Pre-tokenizer in the style of BPE models: words, numbers and single punctuation marks
+_PIECE_RE = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+_SENTENCE_RE = re.compile(r"(?<=[.!?•])\s+|\n+")
+
+
+def count_tokens(text):
+    """
+    Estimates the model's token count: every punctuation mark and number is a token, and
+    words take one token per ~5 letters (common words are one token, long/rare ones split).
+    Local and instant, unlike the API's count_tokens; benchmarks/bench_condense.py --exact compares the two.
+    """
+    count = 0
+    for piece in _PIECE_RE.findall(text):
+        if piece[0].isalpha():
+            count += max(1, math.ceil(len(piece) / 5))
+        elif piece[0].isdigit():
+            count += math.ceil(len(piece) / 3)
+        else:
+            count += 1
+    return count
+
+
+def split_sentences(text):
+    return [sentence.strip() for sentence in _SENTENCE_RE.split(text) if sentence.strip()]
+
+
+def document_sections(outline, pages):
+    """
+    [(heading, text), ...] in reading order: every outline heading owns the text up to the next
+    heading, across page breaks. Text before the first heading goes under the document itself ("").
+    """
+    by_page = {}
+    for item in outline:
+        by_page.setdefault(item['page'], []).append(item['text'])
+
+    sections = [["", []]]
+    for page_number, page_text in enumerate(pages):
+        headings = by_page.get(page_number, [])
+        texts = section_texts(page_text, headings)
+        located = [text for text in texts if text]
+        first = page_text.find(located[0]) if located else -1
+        sections[-1][1].append(page_text[:first] if first != -1 else page_text)
+        for heading, text in zip(headings, texts):
+            # section_texts includes the heading itself at the start of its text
+            sections.append([heading, [text[len(heading):] if text.startswith(heading) else text]])
+    return [(heading, " ".join(parts).strip()) for heading, parts in sections if heading or "".join(parts).strip()]
+
+
+def format_insights(insights):
+    if not insights:
+        return ""
+    if not isinstance(insights, dict):
+        return str(insights)
+    lines = []
+    for category, items in insights.items():
+        lines.append(f"{category.replace('_', ' ').capitalize()}:")
+        if isinstance(items, (list, tuple)):
+            lines.extend(f"- {item}" for item in items)
+        elif items:
+            lines.append(str(items))
+    return "\n".join(lines)
+
+
+def score_sentences(sections, insights_text=""):
+    """
+    Ranks each section's sentences: the sum of the sentence's term weights (document frequency
+    x how few sections use the term), length-normalised, boosted by overlap with the section
+    heading and the insights. Returns [[(score, position, sentence), ...] best first, per section].
+    """
+    section_tokens = [[tokenize(sentence) for sentence in split_sentences(text)] for _, text in sections]
+    term_counts, section_df = Counter(), Counter()
+    for sentences in section_tokens:
+        terms = set()
+        for tokens in sentences:
+            term_counts.update(tokens)
+            terms.update(tokens)
+        section_df.update(terms)
+    n_sections = len(sections) or 1
+    weight = {term: math.log(1 + count) * math.log(1 + n_sections / section_df[term]) for term, count in term_counts.items()}
+    insight_terms = set(tokenize(insights_text))
+
+    ranked = []
+    for (heading, text), sentences_tokens in zip(sections, section_tokens):
+        heading_terms = set(tokenize(heading))
+        scored = []
+        for position, (sentence, tokens) in enumerate(zip(split_sentences(text), sentences_tokens)):
+            if len(sentence.split()) < MIN_SENTENCE_WORDS:
+                continue
+            terms = set(tokens)
+            score = sum(weight[term] for term in terms) / math.sqrt(len(tokens) or 1)
+            score *= 1 + 0.5 * len(terms & heading_terms) + 0.25 * len(terms & insight_terms)
+            scored.append((score, position, sentence))
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        ranked.append(scored)
+    return ranked
+
+
+def condense_document(title, outline, pages, insights=None, budget=None):
+    """
+    Builds a prompt-sized view of a document within budget tokens: the title, the outline
+    headings (the best-scoring sections' if they would take over half the budget), the existing
+    insights, and as many of each section's best sentences as fit. Sentences
+    are taken round-robin (best of every section first), then printed in reading order.
+    Documents that already fit (and a budget of 0) get the full text, as the prompts used to.
+    """
+    budget = CONDENSE_TOKEN_BUDGET if budget is None else budget
+    insights_text = format_insights(insights)
+    full_text = f"{''.join(pages)} \n {insights}" if insights else "".join(pages)
+    if budget <= 0 or count_tokens(full_text) <= budget:
+        return full_text
+
+    sections = document_sections(outline, pages)
+    ranked = score_sentences(sections, insights_text)
+
+    used = count_tokens(title) + count_tokens(insights_text)
+    # Headings may take at most half of what is left; long outlines keep their best-scoring sections
+    heading_costs = [count_tokens(f"## {heading}\n") if heading else 0 for heading, _ in sections]
+    heading_budget = max(0, budget - used) // 2
+    keep = list(range(len(sections)))
+    if sum(heading_costs) > heading_budget:
+        keep, spent = [], 0
+        for i in sorted(range(len(sections)), key=lambda i: -(ranked[i][0][0] if ranked[i] else 0.0)):
+            if spent + heading_costs[i] <= heading_budget:
+                keep.append(i)
+                spent += heading_costs[i]
+        keep.sort()
+    used += sum(heading_costs[i] for i in keep)
+    headings = [sections[i][0] for i in keep]
+    ranked = [ranked[i] for i in keep]
+    sections = [sections[i] for i in keep]
+
+    chosen = [[] for _ in sections]
+    for rank in range(max((len(scored) for scored in ranked), default=0)):
+        for i, scored in enumerate(ranked):
+            if rank >= len(scored):
+                continue
+            _, position, sentence = scored[rank]
+            cost = count_tokens(sentence)
+            if used + cost > budget:
+                continue
+            chosen[i].append((position, sentence))
+            used += cost
+
+    parts = [title] if title else []
+    for heading, sentences in zip(headings, chosen):
+        body = " ".join(sentence for _, sentence in sorted(sentences))
+        if heading:
+            parts.append(f"## {heading}\n{body}".rstrip())
+        elif body:
+            parts.append(body)
+    if insights_text:
+        parts.append(insights_text)
+    return "\n\n".join(parts)
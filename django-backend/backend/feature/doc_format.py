@@ -0,0 +1,129 @@
+import os
+import sys
+import json
+import mmap
+import struct
+import threading
+
+# --- Parsed document (".pdoc") format ---
+# magic (4 bytes) | version (1 byte) | header length (uint32, little-endian) | header | body
+# The header is UTF-8 JSON: {"title", "outline", "pages": [[offset, length], ...]} with offsets
+# relative to the start of the body. The body is the UTF-8 text of every page, back to back,
+# so reading the outline never touches page text and page N is a single slice of the mmap.
+DOC_SUFFIX = ".pdoc"
+DOC_MAGIC = b"PDOC"
+DOC_VERSION = 1
+_PREAMBLE = struct.Struct("<4sBI")
+
+# Set INTERMEDIATE_JSON_EXPORT=1 to also write the old indent=2 JSON next to each document (debugging)
+JSON_EXPORT = os.getenv("INTERMEDIATE_JSON_EXPORT", "0") == "1"
+
+
+def write_document(path, data):
+    """Writes {title, outline, full_text} to path in the .pdoc format (write-then-rename)."""
+    pages, body, offset = [], [], 0
+    for page_text in data.get('full_text', []):
+        encoded = page_text.encode('utf-8')
+        pages.append([offset, len(encoded)])
+        body.append(encoded)
+        offset += len(encoded)
+
+    header = json.dumps(
+        {"title": data.get('title', ""), "outline": data.get('outline', []), "pages": pages},
+        ensure_ascii=False, separators=(',', ':')
+    ).encode('utf-8')
+
+    tmp_path = f"{path}.partial"
+    with open(tmp_path, 'wb') as f:
+        f.write(_PREAMBLE.pack(DOC_MAGIC, DOC_VERSION, len(header)))
+        f.write(header)
+        for chunk in body:
+            f.write(chunk)
+    os.replace(tmp_path, path)
+    return path
+
+
+class ParsedDocument:
+    """
+    Read-only view of a .pdoc file. Opening it reads only the header (title, outline, page table);
+    page text is read lazily from a memory map.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._file = open(self.path, 'rb')
+        try:
+            magic, version, header_len = _PREAMBLE.unpack(self._file.read(_PREAMBLE.size))
+            if magic != DOC_MAGIC or version != DOC_VERSION:
+                raise ValueError(f"{self.path} is not a version {DOC_VERSION} parsed document")
+            header = json.loads(self._file.read(header_len).decode('utf-8'))
+        except Exception:
+            self._file.close()
+            raise
+        self.title = header['title']
+        self.outline = header['outline']
+        self._pages = header['pages']
+        self._body_offset = _PREAMBLE.size + header_len
+        self._mmap = None
+        self._mmap_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._pages)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def page(self, page_number):
+        """Returns the text of one page (0-based)."""
+        offset, length = self._pages[page_number]
+        if not length:
+            return ""
+        start = self._body_offset + offset
+        return self._map()[start:start + length].decode('utf-8')
+
+    def full_text(self):
+        return [self.page(n) for n in range(len(self._pages))]
+
+    def to_dict(self):
+        return {"title": self.title, "outline": self.outline, "full_text": self.full_text()}
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+    def _map(self):
+        with self._mmap_lock:
+            if self._mmap is None:
+                self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            return self._mmap
+
+
+def read_outline(path):
+    """Returns (title, outline) without reading any page text."""
+    with ParsedDocument(path) as doc:
+        return doc.title, doc.outline
+
+
+def export_json(path, json_path=None):
+    """Writes a .pdoc document back out as the old indent=2 JSON, for debugging."""
+    json_path = json_path or f"{os.path.splitext(str(path))[0]}.json"
+    with ParsedDocument(path) as doc:
+        data = doc.to_dict()
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    return json_path
+
+
+def main():
+    # python -m backend.feature.doc_format <file.pdoc> [...]  ->  writes <file>.json next to each
+    for path in sys.argv[1:]:
+        print(export_json(path))
+
+
+if __name__ == "__main__":
+    main()
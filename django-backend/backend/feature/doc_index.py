@@ -0,0 +1,171 @@
+import os
+import logging
+import threading
+from pathlib import Path
+from collections import OrderedDict
+
+from backend.feature.doc_format import DOC_SUFFIX, ParsedDocument
+from backend.feature.retrieval import BM25Index, VectorIndex
+
+# Indexes kept in memory per process (one per session temp_files folder), least recently used dropped first
+MAX_CACHED_INDEXES = int(os.getenv("DOC_INDEX_MAX_SESSIONS", 64))
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def folder_signature(json_folder, input_dir=None, curr_dir=None):
+    """
+    Identifies the exact set of parsed documents in a folder; any add/replace/remove changes it.
+    Parsed documents are written by atomic rename, so a replaced one has a new inode. The mtime
+    is left out: the files are hard links into the shared parse cache, whose every hit bumps it.
+    With the session's PDF folders, it also records which one holds each document's PDF, so a
+    document moving between past and current changes it too.
+    """
+    entries = []
+    for path in Path(json_folder).glob(f"*{DOC_SUFFIX}"):
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((path.name, st.st_ino, st.st_size, pdf_folder(path, input_dir, curr_dir)))
+    return tuple(sorted(entries))
+
+
+def pdf_folder(doc_path, input_dir, curr_dir):
+    """The folder holding a parsed document's PDF (input_dir first, as the index looks), or None."""
+    pdf_filename = Path(doc_path).with_suffix('.pdf').name
+    for folder in (input_dir, curr_dir):
+        if folder is not None and (Path(folder) / pdf_filename).exists():
+            return str(folder)
+    return None
+
+
+def section_texts(page_text, headings):
+    """Splits a page's text at its headings; each heading gets the text up to the next one."""
+    positions, cursor = [], 0
+    for heading in headings:
+        pos = page_text.find(heading, cursor)
+        if pos == -1:
+            pos = page_text.find(heading)
+        positions.append(pos)
+        if pos != -1:
+            cursor = pos + len(heading)
+
+    sections = []
+    for i, pos in enumerate(positions):
+        if pos == -1:
+            sections.append("")
+            continue
+        following = [p for p in positions[i + 1:] if p > pos]
+        sections.append(page_text[pos:following[0] if following else len(page_text)].strip())
+    return sections
+
+
+class DocumentIndex:
+    """
+    In-memory view of a session's parsed documents, built once per document set:
+    the outline (heading texts) of every document, and heading text -> where it is
+    (document, PDF path, page, bbox) plus the text of its section.
+    """
+
+    def __init__(self, json_folder, input_dir, curr_dir, signature=None):
+        self.json_folder = str(json_folder)
+        self.signature = folder_signature(json_folder, input_dir, curr_dir) if signature is None else signature
+        self.outlines = {}   # document stem -> [heading text, ...]
+        self.headings = {}   # heading text -> entry dict
+        self._bm25 = None
+        self._vectors = None
+        self._lock = threading.Lock()
+        self._build(Path(input_dir), Path(curr_dir))
+
+    def _build(self, input_dir_path, curr_dir_path):
+        for name, *_ in self.signature:
+            doc_path = Path(self.json_folder) / name
+            try:
+                with ParsedDocument(doc_path) as doc:
+                    self._add_document(doc, doc_path, input_dir_path, curr_dir_path)
+            except Exception as e:
+                logging.error(f"Error indexing {name}: {e}")
+
+    def _add_document(self, doc, doc_path, input_dir_path, curr_dir_path):
+        pdf_filename = doc_path.with_suffix('.pdf').name
+        source_pdf_path = None
+        if (input_dir_path / pdf_filename).exists():
+            source_pdf_path = str(input_dir_path / pdf_filename)
+        elif (curr_dir_path / pdf_filename).exists():
+            source_pdf_path = str(curr_dir_path / pdf_filename)
+        else:
+            logging.warning(f"PDF file not found for {doc_path.name}. Looked in {input_dir_path} and {curr_dir_path}")
+            return
+        self.outlines[doc_path.stem] = [item['text'] for item in doc.outline]
+
+        by_page = {}
+        for item in doc.outline:
+            by_page.setdefault(item['page'], []).append(item)
+
+        for page_number, items in by_page.items():
+            page_text = doc.page(page_number) if 0 <= page_number < len(doc) else ""
+            sections = section_texts(page_text, [item['text'] for item in items])
+            for item, section in zip(items, sections):
+                # Later occurrences win, as they always have for duplicate headings
+                self.headings[item['text'].strip()] = {
+                    "document": os.path.basename(source_pdf_path),
+                    "local_path": source_pdf_path,
+                    "doc_path": str(doc_path),
+                    "page_number": page_number,
+                    "location": [item['top_x'], item['top_y'], item['bot_x'], item['bot_y']],
+                    "section_text": section,
+                    "has_page": 0 <= page_number < len(doc),
+                }
+
+    def outline_lists(self):
+        """Heading texts per document, in the shape process_headings expects."""
+        return list(self.outlines.values())
+
+    def bm25(self):
+        """BM25 index over every heading plus its section text (built on first use, then reused)."""
+        with self._lock:
+            if self._bm25 is None:
+                self._bm25 = BM25Index((heading, entry["section_text"] or heading) for heading, entry in self.headings.items())
+            return self._bm25
+
+    def vectors(self):
+        """TF-IDF matrix over every heading plus its section text (built on first use, then reused)."""
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = VectorIndex((heading, entry["section_text"] or heading) for heading, entry in self.headings.items())
+            return self._vectors
+
+    def page_text(self, heading):
+        """Full text of the page a heading is on (read lazily from the parsed document)."""
+        entry = self.headings[heading]
+        if not entry["has_page"]:
+            return ""
+        with ParsedDocument(entry["doc_path"]) as doc:
+            return doc.page(entry["page_number"])
+
+
+def get_document_index(json_folder, input_dir, curr_dir):
+    """Returns the session's index, rebuilding it only if its documents changed since it was built."""
+    key = str(json_folder)
+    signature = folder_signature(json_folder, input_dir, curr_dir)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None and index.signature == signature:
+            _indexes.move_to_end(key)
+            return index
+
+    index = DocumentIndex(json_folder, input_dir, curr_dir, signature=signature)
+    with _indexes_lock:
+        _indexes[key] = index
+        _indexes.move_to_end(key)
+        while len(_indexes) > MAX_CACHED_INDEXES:
+            _indexes.popitem(last=False)
+    print(f"info - Built document index for {len(index.outlines)} documents in {key}")
+    return index
+
+
+def invalidate_document_index(json_folder):
+    with _indexes_lock:
+        _indexes.pop(str(json_folder), None)
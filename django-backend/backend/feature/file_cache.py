@@ -0,0 +1,151 @@
+import os
+import json
+import fcntl
+import hashlib
+import shutil
+import threading
+import tempfile
+
+
+def sha256_file(path, chunk_size=1024 * 1024):
+    """Returns the hex SHA-256 digest of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FileCache:
+    """
+    Content-addressed file store shared by every session (and every worker process).
+    Entries are written atomically, looked up by key, and evicted least-recently-used
+    first once the directory grows past max_bytes.
+    """
+
+    def __init__(self, cache_dir, max_bytes, suffix=""):
+        self.cache_dir = str(cache_dir)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        # Hit/miss counters live in the directory (like LLMCache's in its database), so lookups made
+        # in ingest pool workers and every gunicorn worker all count towards the same totals
+        self.stats_path = os.path.join(self.cache_dir, ".stats.json")
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def path_for(self, key):
+        return os.path.join(self.cache_dir, f"{key}{self.suffix}")
+
+    def get(self, key):
+        """Returns the cached path for key (bumping its LRU position) or None."""
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self._count(hit=False)
+            return None
+        self._count(hit=True)
+        return path
+
+    def put(self, key, src_path):
+        """Moves src_path into the cache under key and returns the cached path."""
+        path = self.path_for(key)
+        os.replace(src_path, path)
+        self.evict()
+        return path
+
+    def add(self, key, src_path):
+        """Like put(), but links (or copies) src_path into the cache and leaves it in place."""
+        tmp = self.temp_path()
+        try:
+            os.unlink(tmp)
+            try:
+                os.link(src_path, tmp)
+            except OSError:
+                shutil.copyfile(src_path, tmp)
+        except Exception:
+            if os.path.lexists(tmp):
+                os.unlink(tmp)
+            raise
+        return self.put(key, tmp)
+
+    def temp_path(self):
+        """Returns a fresh temporary path inside the cache dir, so put() is an atomic rename."""
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, prefix=".tmp-")
+        os.close(fd)
+        return tmp
+
+    def link_into(self, key, dest_path):
+        """
+        Hard-links the cached entry to dest_path (copying if the filesystem refuses links).
+        Returns False if the entry is missing, e.g. evicted by another worker meanwhile.
+        """
+        path = self.path_for(key)
+        tmp = f"{dest_path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        try:
+            try:
+                os.link(path, tmp)
+            except OSError:
+                shutil.copyfile(path, tmp)
+            os.replace(tmp, dest_path)
+            return True
+        except FileNotFoundError:
+            return False
+        finally:
+            # rename() is a no-op when dest_path is already a link to the same entry
+            if os.path.lexists(tmp):
+                os.unlink(tmp)
+
+    def evict(self):
+        """Deletes least-recently-used entries until the cache fits in max_bytes."""
+        entries, total = [], 0
+        for name in os.listdir(self.cache_dir):
+            if name.startswith("."):  # temporary files and the counters
+                continue
+            try:
+                st = os.stat(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+            total += st.st_size
+
+        entries.sort()
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(os.path.join(self.cache_dir, name))
+                total -= size
+            except FileNotFoundError:
+                continue
+
+    def stats(self):
+        """Hit/miss counts across every process sharing the cache directory."""
+        counters = self._counters()
+        hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+        }
+
+    def _counters(self):
+        try:
+            with open(self.stats_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _count(self, hit):
+        field = "hits" if hit else "misses"
+        try:
+            with open(f"{self.stats_path}.lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                counters = self._counters()
+                counters[field] = counters.get(field, 0) + 1
+                tmp = f"{self.stats_path}.tmp-{os.getpid()}-{threading.get_ident()}"
+                with open(tmp, "w") as f:
+                    json.dump(counters, f)
+                os.replace(tmp, self.stats_path)
+        except OSError:
+            pass  # statistics only; never fail a lookup over them
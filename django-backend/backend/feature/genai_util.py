@@ -1,8 +1,19 @@
 import os
 from dotenv import load_dotenv
 import vertexai
+import re
+import ast
 import json
-from vertexai.generative_models import GenerativeModel
+import hashlib
+import queue
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from vertexai.generative_models import GenerationConfig, GenerativeModel
+
+from backend.feature.condense import condense_document, count_tokens
+from backend.feature.doc_format import DOC_SUFFIX, ParsedDocument
+from backend.feature.llm_cache import llm_cache
 
 load_dotenv() #load env variables
 
@@ -24,40 +35,141 @@ vertexai.init(project=project_id, location=location)
 
 gemini_model = GenerativeModel(model_name=model_name)
 
+# How process_document asks for insights:
+#   "structured" - one request returning all three categories as JSON (response schema);
+#                  documents over INSIGHTS_CHUNK_TOKENS switch to map-reduce automatically
+#   "map_reduce" - always chunk: structured insights per page-aligned chunk, then one merge request
+#   "condensed"  - one structured request over a token-budgeted condensation of the document
+#   "per_prompt" - one request per category, each sending the whole document again
+INSIGHTS_MODES = ("structured", "map_reduce", "condensed", "per_prompt")
+INSIGHTS_MODE = os.getenv("INSIGHTS_MODE", "structured")
 
-def extract_text_from_document(input_dir, document):
-    """Extract and concatenate all text from the document."""
-    doc_path = os.path.join(os.path.join(input_dir, "temp_files"), document.replace('.pdf', '.json'))
+# Map-reduce limits: tokens of document text per chunk, chunks in flight, and chunks per document
+INSIGHTS_CHUNK_TOKENS = int(os.getenv("INSIGHTS_CHUNK_TOKENS", 30000))
+INSIGHTS_MAP_WORKERS = int(os.getenv("INSIGHTS_MAP_WORKERS", 4))
+INSIGHTS_MAX_CHUNKS = int(os.getenv("INSIGHTS_MAX_CHUNKS", 16))
+# Token budgets for the condensed document sent by the "condensed" insights mode and the podcast script
+INSIGHTS_TOKEN_BUDGET = int(os.getenv("INSIGHTS_TOKEN_BUDGET", 8000))
+PODCAST_TOKEN_BUDGET = int(os.getenv("PODCAST_TOKEN_BUDGET", 6000))
+
+# Streaming insights give up on a category that produces no output for this long
+INSIGHTS_STREAM_IDLE_SECONDS = float(os.getenv("INSIGHTS_STREAM_IDLE_SECONDS", 60))
+
+INSIGHT_CATEGORIES = ("key_insights", "did_you_know", "counterpoints")
+# Upper bound per category after the reduce step, matching what the prompts ask for
+INSIGHT_LIMITS = {"key_insights": 5, "did_you_know": 3, "counterpoints": 3}
+
+INSIGHTS_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {category: {"type": "ARRAY", "items": {"type": "STRING"}} for category in INSIGHT_CATEGORIES},
+    "required": list(INSIGHT_CATEGORIES),
+}
+
+
+def open_parsed_document(input_dir, document):
+    """Opens the parsed (.pdoc) version of a session PDF."""
+    doc_path = os.path.join(os.path.join(input_dir, "temp_files"), document.replace('.pdf', DOC_SUFFIX))
     print(doc_path)
 
-    if not os.path.exists(doc_path) or not doc_path.endswith('.json'):
+    if not os.path.exists(doc_path) or not doc_path.endswith(DOC_SUFFIX):
         raise FileNotFoundError(f"File Error")
 
-    with open(doc_path, 'r', encoding='utf-8') as f:
-        try:
-            data = json.load(f).get('full_text', [])
-        except json.JSONDecodeError as e:
-            raise ValueError(f"Error decoding JSON in {doc_path}: {e}")
+    try:
+        return ParsedDocument(doc_path)
+    except ValueError as e:
+        raise ValueError(f"Error reading parsed document {doc_path}: {e}")
 
-    text_parts = ""
-    for item in data:
-        text_parts += item
 
-    return text_parts
+def extract_pages_from_document(input_dir, document):
+    """Returns the text of every page of the parsed document."""
+    with open_parsed_document(input_dir, document) as parsed:
+        return parsed.full_text()
 
 
-def query_llm(prompt):
-    """Query the Gemini LLM API with the given prompt."""
-    try:
-        # Load the model
+def condense_for_prompt(input_dir, document, insights=None, budget=None):
+    """
+    The document (plus any insights already extracted) condensed to at most budget tokens:
+    outline headings and the best sentences of each section instead of the full text.
+    """
+    budget = PODCAST_TOKEN_BUDGET if budget is None else budget
+    if isinstance(insights, dict):
+        # Only the insight lists go into the prompt, not bookkeeping such as skipped_pages
+        insights = {category: items for category, items in insights.items() if category in INSIGHT_CATEGORIES}
+    with open_parsed_document(input_dir, document) as parsed:
+        condensed = condense_document(parsed.title, parsed.outline, parsed.full_text(), insights=insights, budget=budget)
+    print(f"info - Condensed {document} to ~{count_tokens(condensed)} tokens (budget {budget})")
+    return condensed
+
+
+def extract_text_from_document(input_dir, document):
+    """Extract and concatenate all text from the document."""
+    return "".join(extract_pages_from_document(input_dir, document))
+
+
+def is_chunk_boundary(piece, tokens, target_tokens):
+    """
+    Whether a chunk may end after this piece of text: true for a share tokens / target_tokens of
+    pieces, picked by a hash of the piece itself. Chunks then average target_tokens past the floor,
+    whatever the page sizes, and the decision never depends on any other page.
+    """
+    digest = hashlib.sha256(piece.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64 < tokens / target_tokens
+
+
+def chunk_page_spans(pages, max_tokens):
+    """
+    Groups consecutive pages into [(first page, last page, text), ...] chunks of at most max_tokens,
+    never splitting a page unless the page alone is over budget. Boundaries are content-defined:
+    a chunk ends after a page picked by is_chunk_boundary() once it holds max_tokens / 8, or when the
+    next page would not fit. An edit to one page changes its own chunk, and at most the following
+    ones up to the next boundary page; every other chunk (and its cached result) stays the same.
+    """
+    max_chars = max_tokens * 4
+    min_tokens, target_tokens = max_tokens // 8, max(1, max_tokens // 3)
+    spans, current, current_tokens, first_page = [], [], 0, 0
+
+    def close(last_page):
+        text = "".join(current)
+        if text.strip():
+            spans.append((first_page, last_page, text))
+
+    for number, page in enumerate(pages):
+        pieces = [page[i:i + max_chars] for i in range(0, len(page), max_chars)] or [""]
+        for i, piece in enumerate(pieces):
+            tokens = count_tokens(piece)
+            if current and current_tokens + tokens > max_tokens:
+                close(number - 1 if i == 0 else number)
+                current, current_tokens, first_page = [], 0, number
+            current.append(piece)
+            current_tokens += tokens
+            if current_tokens >= min_tokens and is_chunk_boundary(piece, tokens, target_tokens):
+                close(number)
+                current, current_tokens, first_page = [], 0, number + 1 if i == len(pieces) - 1 else number
+    if current:
+        close(len(pages) - 1)
+    return spans
+
+
+def chunk_pages(pages, max_tokens):
+    """The text of each of chunk_page_spans()' chunks."""
+    return [text for _, _, text in chunk_page_spans(pages, max_tokens)]
+
+
+# Generation settings of the one-prompt-per-category requests (shared by query_llm and stream_insights,
+# so both hit the same LLM cache entries)
+QUERY_GENERATION_CONFIG = {
+    "temperature": 0.5,
+    "max_output_tokens": 2000
+}
+
+
+def query_llm(prompt, use_cache=True, accept=None):
+    """Query the Gemini LLM API with the given prompt; responses rejected by accept(response) are not cached."""
+    generation_config = QUERY_GENERATION_CONFIG
+
+    def generate():
         # Generate content
-        response = gemini_model.generate_content(
-            prompt,
-            generation_config={
-                "temperature": 0.5,
-                "max_output_tokens": 2000
-            }
-        )
+        response = gemini_model.generate_content(prompt, generation_config=generation_config)
 
         # Extract generated text
         if response.candidates and len(response.candidates) > 0:
@@ -66,6 +178,9 @@ def query_llm(prompt):
             print("No valid response generated.")
             return None
 
+    try:
+        return llm_cache.cached_call(model_name, generation_config, prompt, generate, bypass=not use_cache, accept=accept)
+
     except Exception as e:
         print(f"API request failed: {e}")
         return None
@@ -97,23 +212,276 @@ def generate_prompts_enhanced(text):
   return prompts
 
 
-def process_document(input, document):
+def generate_structured_prompt(text):
+    """One prompt covering every insight category; the response schema fixes the output shape."""
+    return (
+        "Analyse the following text and return a JSON object with three lists of strings:\n"
+        "- key_insights: 3-5 key insights from the text.\n"
+        "- did_you_know: 2-3 interesting 'Did You Know?' facts from the text.\n"
+        "- counterpoints: 2-3 potential counterpoints or opposing views to the main arguments in the text.\n"
+        "If the text itself does not contain enough information for a list, research the topic of the text "
+        "(or infer common counterarguments) so that every list is filled.\n\nText:\n" + text
+    )
+
+
+def parse_list_response(raw):
+    """Turns a python-list-looking model response into a real list; anything else is returned unchanged."""
+    if not isinstance(raw, str):
+        return raw
+    try:
+        parsed = ast.literal_eval(raw.strip())
+    except (ValueError, SyntaxError):
+        return raw
+    return [str(item) for item in parsed] if isinstance(parsed, (list, tuple)) else raw
+
+
+def is_list_response(raw):
+    """True if a category response parses into a list, i.e. it is worth caching."""
+    return isinstance(parse_list_response(raw), list)
+
+
+def query_insights_structured(text, use_cache=True):
+    """
+    Asks for all insight categories in a single request with a JSON response schema.
+    Returns {category: [str, ...]} or None if the response does not match the schema.
+    """
+    return query_structured(generate_structured_prompt(text), use_cache=use_cache)
+
+
+def query_structured(prompt, use_cache=True):
+    """Sends a prompt with the insights response schema; {category: [str, ...]} or None."""
+    generation_config = {
+        "temperature": 0.5,
+        "max_output_tokens": 4000,
+        "response_mime_type": "application/json",
+        "response_schema": INSIGHTS_SCHEMA,
+    }
+
+    def generate():
+        response = gemini_model.generate_content(prompt, generation_config=GenerationConfig(**generation_config))
+        return response.text.strip() if response.candidates else None
+
+    try:
+        raw = llm_cache.cached_call(
+            model_name, generation_config, prompt, generate,
+            bypass=not use_cache, accept=lambda response: parse_insights_json(response) is not None
+        )
+    except Exception as e:
+        logging.error(f"Structured insights request failed: {e}")
+        return None
+
+    results = parse_insights_json(raw)
+    if results is None:
+        logging.warning(f"Structured insights response did not match the schema: {raw!r}")
+    return results
+
+
+def parse_insights_json(raw):
+    """{category: [str, ...]} from a structured insights response, or None if it does not match the schema."""
+    try:
+        data = json.loads(raw) if raw else None
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or not all(isinstance(data.get(category), list) for category in INSIGHT_CATEGORIES):
+        return None
+    return {category: [str(item) for item in data[category]] for category in INSIGHT_CATEGORIES}
+
+
+def normalize_insight(text):
+    return re.sub(r"[^a-z0-9]+", " ", text.lower()).strip()
+
+
+def merge_insights(partials):
+    """Concatenates per-chunk insights category by category, dropping exact and near-exact repeats."""
+    merged = {category: [] for category in INSIGHT_CATEGORIES}
+    seen = {category: set() for category in INSIGHT_CATEGORIES}
+    for partial in partials:
+        for category in INSIGHT_CATEGORIES:
+            for item in partial[category]:
+                key = normalize_insight(item)
+                if key and key not in seen[category]:
+                    seen[category].add(key)
+                    merged[category].append(item)
+    return merged
+
+
+def generate_reduce_prompt(merged):
+    return (
+        "The following insights were extracted from consecutive parts of one document. "
+        "Merge them into a single set for the whole document: combine duplicates and near-duplicates, "
+        "keep the most important and specific points, and return a JSON object with "
+        f"at most {INSIGHT_LIMITS['key_insights']} key_insights, {INSIGHT_LIMITS['did_you_know']} did_you_know facts "
+        f"and {INSIGHT_LIMITS['counterpoints']} counterpoints.\n\n" + json.dumps(merged, ensure_ascii=False, indent=1)
+    )
+
+
+def map_reduce_insights(pages, chunk_tokens=None, workers=None, max_chunks=None, use_cache=True):
+    """
+    Insights for documents too long for one prompt: page-aligned chunks are analysed in parallel
+    (each chunk result is cached by its prompt, so a re-run only pays for changed chunks), then
+    one request merges and deduplicates the per-chunk lists. Returns None if no chunk succeeded.
+    """
+    chunk_tokens = chunk_tokens or INSIGHTS_CHUNK_TOKENS
+    workers = workers or INSIGHTS_MAP_WORKERS
+    max_chunks = max_chunks or INSIGHTS_MAX_CHUNKS
+
+    spans = chunk_page_spans(pages, chunk_tokens)
+    skipped_pages = []
+    if len(spans) > max_chunks:
+        # Keep coverage of the whole document: take chunks spread evenly from start to end
+        step = len(spans) / max_chunks
+        kept = [spans[int(i * step)] for i in range(max_chunks)]
+        skipped_pages = sorted(
+            {page + 1 for span in spans if span not in kept for page in range(span[0], span[1] + 1)}
+            - {page + 1 for span in kept for page in range(span[0], span[1] + 1)}
+        )
+        print(f"info - {len(spans)} chunks exceed the cap of {max_chunks}; sampling evenly across the document, "
+              f"skipping pages {format_page_ranges(skipped_pages)}")
+        spans = kept
+    chunks = [text for _, _, text in spans]
+    print(f"Processing insights over {len(chunks)} chunks (map-reduce)...")
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(chunks) or 1)) as executor:
+        partials = [result for result in executor.map(lambda chunk: query_insights_structured(chunk, use_cache), chunks) if result]
+    if not partials:
+        return None
+
+    merged = merge_insights(partials)
+    if len(partials) == 1:
+        results = merged
+    else:
+        results = query_structured(generate_reduce_prompt(merged), use_cache=use_cache)
+        if results is None:
+            # Merge request failed: fall back to the locally deduplicated lists, trimmed to the usual sizes
+            results = {category: merged[category][:INSIGHT_LIMITS[category]] for category in INSIGHT_CATEGORIES}
+    if skipped_pages:
+        # Reported with the insights (1-based page numbers) so the client can tell they are partial
+        results["skipped_pages"] = skipped_pages
+    return results
+
+
+def format_page_ranges(page_numbers):
+    """[3, 4, 5, 9] -> "3-5, 9"."""
+    ranges = []
+    for number in page_numbers:
+        if ranges and number == ranges[-1][1] + 1:
+            ranges[-1][1] = number
+        else:
+            ranges.append([number, number])
+    return ", ".join(f"{first}-{last}" if first != last else str(first) for first, last in ranges)
+
+
+def process_document(input, document, mode=None):
     """Process a document to extract insights."""
-    text = extract_text_from_document(input, document)
+    mode = mode or INSIGHTS_MODE
+    if mode not in INSIGHTS_MODES:
+        raise ValueError(f"Unknown insights mode '{mode}', expected one of {INSIGHTS_MODES}")
+
+    pages = extract_pages_from_document(input, document)
+    text = "".join(pages)
     if not text.strip():
         raise ValueError("No text found in document")
 
+    if mode == "structured" and count_tokens(text) > INSIGHTS_CHUNK_TOKENS:
+        mode = "map_reduce"
+
+    if mode in ("structured", "map_reduce", "condensed"):
+        if mode == "structured":
+            print("Processing insights (single structured request)...")
+            results = query_insights_structured(text)
+        elif mode == "condensed":
+            print("Processing insights (single structured request over the condensed document)...")
+            results = query_insights_structured(condense_for_prompt(input, document, budget=INSIGHTS_TOKEN_BUDGET))
+        else:
+            results = map_reduce_insights(pages)
+        if results is not None:
+            return results, text
+        print("Structured request failed, falling back to one prompt per category...")
+
     prompts = generate_prompts_enhanced(text)
     results = {}
 
     # Process each prompt sequentially
     for key, prompt in prompts.items():
         print(f"Processing {key.replace('_', ' ')}...")
-        results[key] = query_llm(prompt)
+        results[key] = parse_list_response(query_llm(prompt, accept=is_list_response))
 
     return results, text
 
 
+def stream_category(category, prompt, events, use_cache=True):
+    """
+    Runs one category prompt with streaming output, putting ("delta", ...) events on the queue for each
+    chunk of text, then ("category", ...) with the parsed list (or ("category_error", ...)), then None.
+    """
+    streamed = []
+
+    def generate():
+        parts = []
+        for chunk in gemini_model.generate_content(prompt, generation_config=QUERY_GENERATION_CONFIG, stream=True):
+            if chunk.candidates and chunk.candidates[0].content.parts:
+                text = chunk.candidates[0].content.parts[0].text
+                if text:
+                    parts.append(text)
+                    events.put(("delta", {"category": category, "text": text}))
+        streamed.append(True)
+        return "".join(parts).strip()
+
+    try:
+        raw = llm_cache.cached_call(
+            model_name, QUERY_GENERATION_CONFIG, prompt, generate, bypass=not use_cache, accept=is_list_response
+        )
+        if not raw:
+            raise ValueError("No valid response generated.")
+        if not streamed:
+            events.put(("delta", {"category": category, "text": raw}))  # served from the cache
+        events.put(("category", {"category": category, "items": parse_list_response(raw)}))
+    except Exception as e:
+        print(f"API request failed for {category}: {e}")
+        events.put(("category_error", {"category": category, "error": str(e)}))
+    finally:
+        events.put(None)
+
+
+def stream_insights(input, document, use_cache=True):
+    """
+    Insights with streaming output: the per-category prompts run concurrently and this yields
+    ("delta", {category, text}) as the model produces text, ("category", {category, items}) as each
+    category completes (or ("category_error", {category, error})), and finally ("done", {results}).
+    Documents over INSIGHTS_CHUNK_TOKENS are condensed first so every prompt fits the model.
+    """
+    pages = extract_pages_from_document(input, document)
+    text = "".join(pages)
+    if not text.strip():
+        raise ValueError("No text found in document")
+    if count_tokens(text) > INSIGHTS_CHUNK_TOKENS:
+        text = condense_for_prompt(input, document, budget=INSIGHTS_TOKEN_BUDGET)
+
+    events = queue.Queue()
+    prompts = generate_prompts_enhanced(text)
+    for category, prompt in prompts.items():
+        threading.Thread(target=stream_category, args=(category, prompt, events, use_cache), daemon=True).start()
+
+    results, running = {}, set(prompts)
+    while running:
+        try:
+            event = events.get(timeout=INSIGHTS_STREAM_IDLE_SECONDS)
+        except queue.Empty:
+            # A category that produced nothing for this long is hung: report it and finish without it
+            for category in running:
+                print(f"error - Insights category {category} timed out")
+                yield "category_error", {"category": category, "error": "Timed out waiting for the model."}
+            break
+        if event is None:
+            continue
+        if event[0] in ("category", "category_error"):
+            running.discard(event[1]["category"])
+            if event[0] == "category":
+                results[event[1]["category"]] = event[1]["items"]
+        yield event
+    yield "done", {"results": {category: results.get(category) for category in prompts}}
+
+
 def main():
     input_dir = "/content/sample_data"
     file_name = "South_of_France_-_History.pdf"
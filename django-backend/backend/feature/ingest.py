@@ -0,0 +1,278 @@
+import os
+import sys
+import json
+import math
+import time
+import signal
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from pathlib import Path
+
+import fitz  # PyMuPDF
+from dotenv import load_dotenv
+
+from backend.feature.base_feature import (
+    build_output_data, create_output_json, extract_page_range, parse_cache_key,
+    pages_to_dict, pdf_to_dict, reference_page_height,
+)
+
+load_dotenv()
+
+# --- Ingest pool configuration ---
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", min(4, os.cpu_count() or 1)))
+INGEST_DOC_TIMEOUT_SECONDS = int(os.getenv("INGEST_DOC_TIMEOUT_SECONDS", 120))
+# "spawn" keeps the workers clear of the locks held by the server's own threads at fork time
+INGEST_START_METHOD = os.getenv("INGEST_START_METHOD", "spawn")
+# Recycle parser processes periodically; PyMuPDF holds on to memory between documents
+INGEST_TASKS_PER_CHILD = 50
+# PDFs with at least this many pages are split into page-range shards parsed on several cores
+INGEST_SHARD_MIN_PAGES = int(os.getenv("INGEST_SHARD_MIN_PAGES", 200))
+INGEST_SHARD_PAGES = int(os.getenv("INGEST_SHARD_PAGES", 100))
+
+_pool = None
+_pool_workers = 0
+_pool_users = {}       # pool -> parse batches currently using it
+_retired_pools = set()  # pools no longer handed out, terminated once their last batch is done
+_pool_lock = threading.Lock()
+
+
+class ParseTimeout(Exception):
+    pass
+
+
+def _raise_timeout(signum, frame):
+    raise ParseTimeout("Parsing took too long")
+
+
+def _run_with_timeout(timeout, func, *args):
+    """
+    Runs in a pool worker: returns (result, error) and never lets an exception escape.
+    The timeout is a SIGALRM, which only the main thread can install; elsewhere it is not enforced.
+    """
+    has_alarm = hasattr(signal, "SIGALRM") and threading.current_thread() is threading.main_thread()
+    if has_alarm:
+        signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.alarm(timeout)
+    try:
+        return func(*args), None
+    except ParseTimeout:
+        return None, f"Parsing exceeded {timeout}s"
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+    finally:
+        if has_alarm:
+            signal.alarm(0)
+
+
+@contextmanager
+def borrowed_pool(workers):
+    """
+    The parser pool shared by every session, sized to workers, for one batch of parses. Retired
+    pools are only terminated once no batch uses them, so one session never kills another's parses.
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _retire_locked(_pool)
+            ctx = multiprocessing.get_context(INGEST_START_METHOD)
+            _pool = ctx.Pool(processes=workers, maxtasksperchild=INGEST_TASKS_PER_CHILD)
+            _pool_workers = workers
+        pool = _pool
+        _pool_users[pool] = _pool_users.get(pool, 0) + 1
+    try:
+        yield pool
+    finally:
+        with _pool_lock:
+            _pool_users[pool] -= 1
+            if pool in _retired_pools and not _pool_users[pool]:
+                _retire_locked(pool)
+
+
+def retire_pool(pool):
+    """
+    Stops handing out a pool with a stuck worker; the next batch starts a fresh one. Other
+    sessions' parses already queued on it run to completion before it is terminated.
+    """
+    with _pool_lock:
+        _retire_locked(pool)
+
+
+def _retire_locked(pool):
+    global _pool
+    if _pool is pool:
+        _pool = None
+    if _pool_users.get(pool, 0):
+        _retired_pools.add(pool)
+        return
+    _pool_users.pop(pool, None)
+    _retired_pools.discard(pool)
+    pool.terminate()
+
+
+def plan_shards(pdf_path, shard_pages=None, min_pages=None):
+    """
+    Returns ([(start, stop), ...], reference page height) for a PDF long enough to shard,
+    or (None, None) when it should be parsed in one piece.
+    """
+    shard_pages = INGEST_SHARD_PAGES if shard_pages is None else shard_pages
+    min_pages = INGEST_SHARD_MIN_PAGES if min_pages is None else min_pages
+    try:
+        doc = fitz.open(pdf_path)
+        page_count, height = len(doc), reference_page_height(doc)
+        doc.close()
+    except Exception:
+        # Let the worker hit (and report) the same error
+        return None, None
+    if page_count < min_pages or page_count <= shard_pages:
+        return None, None
+    return [(start, start + shard_pages) for start in range(0, page_count, shard_pages)], height
+
+
+def submit_shards(pool, pdf_path, shards, timeout):
+    """Queues the page-range shards' extraction in the pool; returns their AsyncResults in page order."""
+    return [pool.apply_async(_run_with_timeout, (timeout, extract_page_range, pdf_path, start, stop)) for start, stop in shards]
+
+
+def merge_shards(outcomes, height):
+    """Merges the shards' (pages, error) outcomes, in page order, into pdf_to_dict's result."""
+    pages = []
+    for shard_pages, error in outcomes:
+        if error:
+            raise RuntimeError(error)
+        pages.extend(shard_pages)
+    return pages_to_dict(pages, height)
+
+
+def parse_sharded(pdf_path, shards, height, pool, timeout):
+    """Extracts the page-range shards in the pool and merges them into pdf_to_dict's result."""
+    results = submit_shards(pool, pdf_path, shards, timeout)
+    return merge_shards([result.get(timeout=timeout + 30) for result in results], height)
+
+
+def parse_documents(pdf_paths, output_dir, cache=None, workers=None, timeout=None, on_state=None):
+    """
+    Parses PDFs into output_dir in parallel, one process per document (or per page-range shard
+    for very long documents). A corrupt or slow PDF only fails itself: returns
+    {pdf_path: error message} for the failures. Each parsed document lands in output_dir via an atomic
+    rename, so readers never see a partial file.
+    on_state(pdf_path, state, error) is called with "parsing", then "ready" or "failed",
+    in the order documents actually finish.
+    """
+    workers = INGEST_WORKERS if workers is None else workers
+    timeout = INGEST_DOC_TIMEOUT_SECONDS if timeout is None else timeout
+    on_state = on_state or (lambda pdf_path, state, error=None: None)
+    pdf_paths = list(pdf_paths)
+    failures = {}
+    if not pdf_paths:
+        return failures
+
+    def finish(pdf_path, error):
+        if error:
+            failures[pdf_path] = error
+            print(f"error - Failed to parse {Path(pdf_path).name}: {error}")
+            on_state(pdf_path, "failed", error)
+        else:
+            on_state(pdf_path, "ready", None)
+
+    # In-process parsing can only enforce the timeout from the main thread (SIGALRM); the server
+    # calls this from a background thread, so there even a single worker goes through the pool
+    if workers <= 1 and threading.current_thread() is threading.main_thread():
+        for pdf_path in pdf_paths:
+            on_state(pdf_path, "parsing", None)
+            _, error = _run_with_timeout(timeout, create_output_json, pdf_path, output_dir, cache)
+            finish(pdf_path, error)
+        return failures
+
+    workers = max(workers, 1)
+    with borrowed_pool(workers) as pool:
+        pending, task_count = {}, 0
+        for pdf_path in pdf_paths:
+            shards, height = (None, None)
+            if not (cache and os.path.exists(cache.path_for(parse_cache_key(pdf_path)))):
+                shards, height = plan_shards(pdf_path)
+            if shards:
+                # Shard extraction is queued now; the merge and write happen below in this process
+                results = submit_shards(pool, pdf_path, shards, timeout)
+                pending[pdf_path] = (results, height)
+                task_count += len(results)
+            else:
+                pending[pdf_path] = ([pool.apply_async(_run_with_timeout, (timeout, create_output_json, pdf_path, output_dir, cache))], None)
+                task_count += 1
+            on_state(pdf_path, "parsing", None)
+
+        # Workers enforce the per-task timeout themselves; this backstop catches a worker that
+        # died (e.g. PyMuPDF segfault) or is stuck inside C code where the alarm cannot fire.
+        waves = math.ceil(task_count / workers)
+        backstop = timeout * waves + 30
+        deadline = time.monotonic() + backstop
+        stuck = False
+        while pending:
+            for pdf_path, (results, height) in list(pending.items()):
+                if not all(result.ready() for result in results) and time.monotonic() < deadline:
+                    continue
+                del pending[pdf_path]
+
+                error, outcomes = None, []
+                for result in results:
+                    if not result.ready():
+                        error = f"Parsing did not finish within {backstop}s"
+                        stuck = True
+                        break
+                    try:
+                        value, error = result.get()
+                    except Exception as e:
+                        error = f"{type(e).__name__}: {e}"
+                    if error:
+                        break
+                    outcomes.append((value, None))
+
+                if not error and height is not None:
+                    try:
+                        create_output_json(pdf_path, output_dir, cache, parse=lambda _: merge_shards(outcomes, height))
+                    except Exception as e:
+                        error = f"{type(e).__name__}: {e}"
+                finish(pdf_path, error)
+            if pending:
+                time.sleep(0.05)
+
+        if stuck:
+            retire_pool(pool)
+    return failures
+
+
+def check_sharded_parse(pdf_path, shard_pages=None, workers=None, timeout=None):
+    """
+    Determinism check: parses the PDF sequentially and as page-range shards and returns
+    True if both produce exactly the same output document.
+    """
+    workers = INGEST_WORKERS if workers is None else workers
+    timeout = INGEST_DOC_TIMEOUT_SECONDS if timeout is None else timeout
+    sequential = build_output_data(*pdf_to_dict(pdf_path))
+
+    shards, height = plan_shards(pdf_path, shard_pages=shard_pages, min_pages=0)
+    if not shards:
+        print("info - Document too short to shard; nothing to compare.")
+        return True
+    with borrowed_pool(max(workers, 2)) as pool:
+        sharded = build_output_data(*parse_sharded(pdf_path, shards, height, pool, timeout))
+
+    same = json.dumps(sequential, ensure_ascii=False) == json.dumps(sharded, ensure_ascii=False)
+    print(f"{'info' if same else 'error'} - {Path(pdf_path).name}: {len(shards)} shards, "
+          f"sharded output {'matches' if same else 'DIFFERS from'} the sequential parse")
+    return same
+
+
+def main():
+    # python -m backend.feature.ingest <pdf> [<pdf> ...]
+    pdf_paths = sys.argv[1:]
+    if not pdf_paths:
+        print("Usage: python -m backend.feature.ingest <pdf> [<pdf> ...]")
+        sys.exit(2)
+    results = [check_sharded_parse(pdf_path, shard_pages=max(1, INGEST_SHARD_PAGES)) for pdf_path in pdf_paths]
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
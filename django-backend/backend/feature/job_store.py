@@ -0,0 +1,279 @@
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Job store configuration ---
+# One SQLite file (WAL mode) shared by every gunicorn worker, so any worker can see (and wait for)
+# a session's insights/podcast job, and results survive worker recycling
+JOB_STORE_PATH = os.getenv(
+    "JOB_STORE_PATH",
+    str(Path(__file__).resolve().parent.parent.parent / "media" / "jobs.sqlite3"),
+)
+# A pending/running job whose owner is on another host and hasn't written for this long is
+# treated as abandoned; an owner on this host is checked directly
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", 15 * 60))
+JOB_POLL_SECONDS = 0.25
+
+# pending: queued (e.g. the PDF is still being parsed); running: claimed by exactly one process;
+# done / failed: finished; idle: holds results written outside a job (the streaming endpoints)
+ACTIVE_STATES = ("pending", "running")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    session_id TEXT PRIMARY KEY,
+    job_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    result TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    text TEXT
+);
+"""
+
+
+class JobSuperseded(Exception):
+    """Raised at a pipeline checkpoint once the job is no longer the session's current one."""
+
+
+def process_owner():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def owner_alive(owner):
+    """True/False for a process on this host, None if the owner is on another host."""
+    host, _, pid = owner.rpartition(":")
+    if host != socket.gethostname():
+        return None
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    except ValueError:
+        return None
+    return True
+
+
+class JobStore:
+    """
+    The insights + podcast job of every session: {job_id, state, result, owner, created, updated}.
+    result is the dict session_processing_results used to hold (results, file_name, podcast,
+    podcast_error, error, partial_results). The document text is kept in its own column, out of
+    the result every poll reads (see get_text). Writes are read-modify-write transactions under
+    SQLite's write lock, and claim() lets exactly one process run a session's job.
+    """
+
+    def __init__(self, path, stale_seconds):
+        self.path = str(path)
+        self.stale_seconds = stale_seconds
+        self._local = threading.local()
+
+    def get(self, session_id):
+        row = self._connect().execute(
+            "SELECT job_id, state, result, owner, created, updated FROM jobs WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return self._job(row)
+
+    def get_text(self, session_id):
+        """The document text stored with the session's job results, or None."""
+        row = self._connect().execute("SELECT text FROM jobs WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row else None
+
+    def is_current(self, session_id, job_id):
+        """Whether job_id is still the session's job; every reset (e.g. a re-upload) supersedes it."""
+        row = self._connect().execute("SELECT job_id FROM jobs WHERE session_id = ?", (session_id,)).fetchone()
+        return row is not None and row[0] == job_id
+
+    def current_job_id(self, session_id):
+        """
+        The session's job id, creating an idle entry if there is none. Work done outside a job (the
+        streaming endpoints) passes it to update(), so its results are dropped after a re-upload.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO jobs (session_id, job_id, state, result, owner, created, updated) VALUES (?, ?, 'idle', '{}', ?, ?, ?)",
+                (session_id, uuid.uuid4().hex, process_owner(), now, now),
+            )
+            return conn.execute("SELECT job_id FROM jobs WHERE session_id = ?", (session_id,)).fetchone()[0]
+
+    def checkpoint(self, session_id, job_id):
+        """Called between pipeline stages: raises JobSuperseded so a superseded job stops early."""
+        if not self.is_current(session_id, job_id):
+            raise JobSuperseded(f"job {job_id} of session {session_id} was superseded")
+
+    def abandoned(self, job):
+        """An active job whose owning process is gone (it died or was recycled mid-job)."""
+        if not job or job["state"] not in ACTIVE_STATES:
+            return False
+        alive = owner_alive(job["owner"])
+        if alive is None:
+            return time.time() - job["updated"] > self.stale_seconds
+        return not alive
+
+    def is_active(self, job):
+        return bool(job) and job["state"] in ACTIVE_STATES and not self.abandoned(job)
+
+    def reset(self, session_id, result=None, state="pending"):
+        """Starts a new job for the session, superseding any previous one, and returns its id."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (session_id, job_id, state, result, owner, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (session_id, job_id, state, json.dumps(result or {}), process_owner(), now, now),
+            )
+        return job_id
+
+    def claim(self, session_id, job_id=None, reopen=False):
+        """
+        Makes this process the one running the session's job; returns the job id, or None if another
+        live process has it or it already finished. With job_id, only that (pending) job is claimed;
+        without, a missing or idle entry gets a job, and an abandoned job is taken over.
+        reopen=True also claims a finished job (to add to its results, e.g. a missing podcast).
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            job = self._job(conn.execute(
+                "SELECT job_id, state, result, owner, created, updated FROM jobs WHERE session_id = ?", (session_id,)
+            ).fetchone())
+            if job is None:
+                if job_id is not None:
+                    return None
+                job_id = uuid.uuid4().hex
+                conn.execute(
+                    "INSERT INTO jobs (session_id, job_id, state, result, owner, created, updated) VALUES (?, ?, 'running', '{}', ?, ?, ?)",
+                    (session_id, job_id, process_owner(), now, now),
+                )
+                return job_id
+            if job_id is not None:
+                if job["job_id"] != job_id or (job["state"] != "pending" and not self.abandoned(job)):
+                    return None
+            elif job["state"] in ACTIVE_STATES:
+                if not self.abandoned(job):
+                    return None
+            elif job["state"] != "idle" and not reopen:
+                return None
+            conn.execute(
+                "UPDATE jobs SET state = 'running', owner = ?, updated = ? WHERE session_id = ?",
+                (process_owner(), now, session_id),
+            )
+            return job["job_id"]
+
+    def update(self, session_id, mutate, job_id=None, state=None, text=None):
+        """
+        Edits the session's result in place with mutate(result), optionally setting the state and
+        the document text. Returns False without writing if job_id is given and no longer the
+        session's job (a superseded job's results are dropped). A missing session gets an idle entry.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            job = self._job(conn.execute(
+                "SELECT job_id, state, result, owner, created, updated FROM jobs WHERE session_id = ?", (session_id,)
+            ).fetchone())
+            if job is None:
+                if job_id is not None:
+                    return False
+                job = {"job_id": uuid.uuid4().hex, "state": "idle", "result": {}, "owner": process_owner(), "created": now}
+            elif job_id is not None and job["job_id"] != job_id:
+                return False
+            mutate(job["result"])
+            # An upsert rather than INSERT OR REPLACE, so the text column survives updates that don't set it
+            conn.execute(
+                "INSERT INTO jobs (session_id, job_id, state, result, owner, created, updated, text) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (session_id) DO UPDATE SET state = excluded.state, result = excluded.result, "
+                "updated = excluded.updated, text = COALESCE(excluded.text, jobs.text)",
+                (session_id, job["job_id"], state or job["state"], json.dumps(job["result"]), job["owner"], job["created"], now, text),
+            )
+        return True
+
+    def wait(self, session_id, timeout=None, until=None):
+        """
+        Blocks until the session's job is no longer active (finished, failed or abandoned), until(job)
+        is true, or timeout seconds have passed; returns the job as last seen.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        job, seen = None, None
+        while True:
+            # Only an updated row is read and parsed again
+            row = self._connect().execute("SELECT updated FROM jobs WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None or row[0] != seen:
+                job, seen = self.get(session_id), row and row[0]
+            if not self.is_active(job) or (until is not None and until(job)):
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                return job
+            time.sleep(JOB_POLL_SECONDS)
+
+    def forget(self, session_id):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM jobs WHERE session_id = ?", (session_id,))
+
+    def stats(self):
+        rows = self._connect().execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return dict(rows)
+
+    def _job(self, row):
+        if row is None:
+            return None
+        job_id, state, result, owner, created, updated = row
+        return {"job_id": job_id, "state": state, "result": json.loads(result), "owner": owner, "created": created, "updated": updated}
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so read-modify-write is atomic across processes
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _connect(self):
+        # Connections are per thread and per process (a forked child must not reuse its parent's)
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        if "text" not in [column[1] for column in conn.execute("PRAGMA table_info(jobs)")]:
+            try:
+                conn.execute("ALTER TABLE jobs ADD COLUMN text TEXT")  # stores made before the text column
+            except sqlite3.OperationalError:
+                pass  # another worker added it first
+        self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+
+job_store = JobStore(JOB_STORE_PATH, JOB_STALE_SECONDS)
+
+
+def main():
+    # python -m backend.feature.job_store [stats|<session id>]
+    if len(sys.argv) > 1 and sys.argv[1] != "stats":
+        job = job_store.get(sys.argv[1])
+        print(json.dumps(job, indent=2))
+    else:
+        print(json.dumps(job_store.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- LLM response cache configuration ---
+# One SQLite file (WAL mode) shared by every gunicorn worker; lives under MEDIA_ROOT/cache like the parse cache
+LLM_CACHE_PATH = os.getenv(
+    "LLM_CACHE_PATH",
+    str(Path(__file__).resolve().parent.parent.parent / "media" / "cache" / "llm_responses.sqlite3"),
+)
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", 7 * 24 * 60 * 60))  # 1 week
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", 64 * 1024 * 1024))  # 64 MB
+# Eviction scans the table, so it runs every N writes rather than on each one
+LLM_CACHE_EVICT_EVERY = 50
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def config_fingerprint(config):
+    """
+    Normalises a generation config (dict, google-genai config object or None) into the part
+    that affects the response; transport settings such as http_options are left out.
+    """
+    if config is None:
+        return {}
+    if hasattr(config, "model_dump"):
+        config = config.model_dump(mode="json", exclude_none=True, exclude={"http_options"})
+    return {k: v for k, v in dict(config).items() if k != "http_options" and v is not None}
+
+
+class LLMCache:
+    """
+    Disk-backed cache of LLM responses keyed by model, generation config and prompt hash.
+    Entries expire after ttl seconds and the least recently used ones are dropped once the
+    responses take more than max_bytes. Safe to share between threads and processes: each
+    thread gets its own connection and SQLite's WAL mode serialises the writers.
+    A cache failure is logged and treated as a miss, never surfaced to the caller.
+    """
+
+    def __init__(self, path, max_bytes, ttl, enabled=True):
+        self.path = str(path)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.enabled = enabled
+        self._local = threading.local()
+        self._writes = 0
+
+    def key(self, model, config, prompt):
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        material = json.dumps([model, config_fingerprint(config), prompt_hash], sort_keys=True, default=str)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Returns the cached response for key, or None if it is missing or expired."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            hit = row is not None and now - row[1] <= self.ttl
+            with conn:
+                if hit:
+                    conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                elif row is not None:
+                    conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._count(conn, "hits" if hit else "misses")
+            return row[0] if hit else None
+        except sqlite3.Error as e:
+            logging.warning(f"LLM cache lookup failed: {e}")
+            return None
+
+    def put(self, key, model, response):
+        if not self.enabled:
+            return
+        now = time.time()
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, model, response, size, created, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, model, response, len(response.encode("utf-8")), now, now),
+                )
+            self._writes += 1
+            if self._writes % LLM_CACHE_EVICT_EVERY == 1:
+                self.evict()
+        except sqlite3.Error as e:
+            logging.warning(f"LLM cache write failed: {e}")
+
+    def cached_call(self, model, config, prompt, call, bypass=False, accept=None):
+        """
+        Returns call()'s response text for this model/config/prompt, from the cache when possible.
+        bypass=True skips the lookup but still stores the fresh response. Empty responses,
+        exceptions and responses rejected by accept(response) are never cached.
+        """
+        if not self.enabled:
+            return call()
+        key = self.key(model, config, prompt)
+        if not bypass:
+            cached = self.get(key)
+            if cached is not None:
+                return cached
+        response = call()
+        if response and (accept is None or accept(response)):
+            self.put(key, model, response)
+        return response
+
+    def evict(self):
+        """Drops expired entries, then least-recently-used ones until the cache fits in max_bytes."""
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+                total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+                if total <= self.max_bytes:
+                    return
+                doomed = []
+                for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed"):
+                    if total <= self.max_bytes:
+                        break
+                    doomed.append((key,))
+                    total -= size
+                conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        except sqlite3.Error as e:
+            logging.warning(f"LLM cache eviction failed: {e}")
+
+    def stats(self):
+        """Hit/miss counts across every process sharing the cache file, plus its current size."""
+        try:
+            conn = self._connect()
+            counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+            entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        except sqlite3.Error as e:
+            logging.warning(f"LLM cache stats failed: {e}")
+            counters, entries, size = {}, 0, 0
+        hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def clear(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM responses")
+            conn.execute("DELETE FROM counters")
+
+    def _count(self, conn, name):
+        conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def _connect(self):
+        # Connections are per thread and per process (a forked child must not reuse its parent's)
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+
+llm_cache = LLMCache(LLM_CACHE_PATH, LLM_CACHE_MAX_BYTES, LLM_CACHE_TTL_SECONDS, enabled=LLM_CACHE_ENABLED)
+
+
+def main():
+    # python -m backend.feature.llm_cache [stats|evict|clear]
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    if command == "evict":
+        llm_cache.evict()
+    elif command == "clear":
+        llm_cache.clear()
+    elif command != "stats":
+        print("Usage: python -m backend.feature.llm_cache [stats|evict|clear]")
+        sys.exit(2)
+    print(json.dumps(llm_cache.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
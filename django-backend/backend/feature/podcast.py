@@ -5,9 +5,17 @@ import vertexai
 from vertexai.generative_models import GenerativeModel
 import ast
 import re
-import html
 import json
+import hashlib
+import tempfile
+from pathlib import Path
 
+from backend.feature.file_cache import FileCache
+from backend.feature.llm_cache import llm_cache
+from backend.feature.tts import (
+    SPEAKER1_VOICE, SPEAKER2_VOICE, SynthesizerPool, concat_mp3, dialogue_turns, mp3_segment_body, ssml_for_turns,
+    ssml_segments, synthesize_segments,
+)
 
 load_dotenv()
 
@@ -32,24 +40,29 @@ gemini_model = GenerativeModel(model_name=model_name)
 speech_key = os.getenv("AZURE_TTS_KEY")
 endpoint = os.getenv("AZURE_TTS_ENDPOINT")
 
-
-
-def summarize_text_with_gemini(text):
-    """
-    Summarize text into a 2-5 minute podcast script.
-    """
-    prompt = """
-    Summarize the following text into a natural, engaging audio script lasting 2 to 5 minutes.
-    Use conversational tone, keep key ideas, and structure it like a short audio episode.
-    Aim for 400-600 words. Output should be free of any formating like '''pyhton or any unnecessary symbols or asterisks.
-    Output two python lists containing strings for two speakers of the podcast. The strings should be sequential ie after the first sentence of speaker 1,
-    the sentence of speaker 2 should start. Text:
-    """ + text
-
-    response = gemini_model.generate_content(prompt).text.strip()
-
-    print(response)
-
+# Streaming mode synthesises this many dialogue turns per segment, so the first audio is ready sooner
+PODCAST_STREAM_TURNS = int(os.getenv("PODCAST_STREAM_TURNS", 2))
+# MP3 segments of one format concatenate without re-encoding
+PODCAST_OUTPUT_FORMAT = speechsdk.SpeechSynthesisOutputFormat.Audio24Khz48KBitRateMonoMp3
+
+# --- Podcast caches (shared by all sessions and workers, untouched by session cleanup) ---
+# Scripts are keyed by the document's content hash, audio by the SSML, voices and output format
+PODCAST_CACHE_DIR = os.getenv(
+    "PODCAST_CACHE_DIR", str(Path(__file__).resolve().parent.parent.parent / "media" / "cache")
+)
+PODCAST_SCRIPT_CACHE_MAX_BYTES = int(os.getenv("PODCAST_SCRIPT_CACHE_MAX_BYTES", 16 * 1024 * 1024))  # 16 MB
+PODCAST_AUDIO_CACHE_MAX_BYTES = int(os.getenv("PODCAST_AUDIO_CACHE_MAX_BYTES", 512 * 1024 * 1024))  # 512 MB
+podcast_script_cache = FileCache(
+    os.path.join(PODCAST_CACHE_DIR, "podcast_scripts"), PODCAST_SCRIPT_CACHE_MAX_BYTES, suffix=".json"
+)
+podcast_audio_cache = FileCache(
+    os.path.join(PODCAST_CACHE_DIR, "podcast_audio"), PODCAST_AUDIO_CACHE_MAX_BYTES, suffix=".mp3"
+)
+
+
+
+def script_lists(response):
+    """The lists of strings in a podcast script response (the speakers' lines), in order."""
     response = re.sub(r'^```(?:python|py)?\s*', '', response, flags=re.IGNORECASE)
     response = re.sub(r'```.*$', '', response, flags=re.DOTALL)
     response = response.strip()
@@ -79,70 +92,201 @@ def summarize_text_with_gemini(text):
         else:
             i += 1
 
+    return lists_found
+
+
+def podcast_prompt(text):
+    """The script request sent to the model for text (the condensed document and its insights)."""
+    return """
+    Summarize the following text into a natural, engaging audio script lasting 2 to 5 minutes.
+    Use conversational tone, keep key ideas, and structure it like a short audio episode.
+    Aim for 400-600 words. Output should be free of any formating like '''pyhton or any unnecessary symbols or asterisks.
+    Output two python lists containing strings for two speakers of the podcast. The strings should be sequential ie after the first sentence of speaker 1,
+    the sentence of speaker 2 should start. Text:
+    """ + text
+
+
+def summarize_text_with_gemini(text, use_cache=True):
+    """
+    Summarize text into a 2-5 minute podcast script.
+    """
+    prompt = podcast_prompt(text)
+
+    # A response without the two speakers' lists is not cached, so the next request asks again
+    response = llm_cache.cached_call(
+        model_name, None, prompt, lambda: gemini_model.generate_content(prompt).text,
+        bypass=not use_cache, accept=lambda response: len(script_lists(response)) >= 2,
+    ).strip()
+
+    print(response)
+
+    lists_found = script_lists(response)
     if len(lists_found) < 2:
         raise ValueError(f"Expected two string lists, found {len(lists_found)}: {lists_found}")
 
     return lists_found[0], lists_found[1]
 
 
-def generate_ssml_for_two_speakers(speaker1_lines, speaker2_lines):
+def podcast_script(text, document_hash=None):
+    """
+    (speaker 1 lines, speaker 2 lines) for the text. With the document's content hash, the script
+    is shared through the script cache, so every session uploading the same PDF reuses it. The key
+    also covers the whole prompt: a new prompt, condense budget or set of insights makes a new script.
+    """
+    if document_hash is None:
+        print("Summarizing with Gemini...")
+        return summarize_text_with_gemini(text)
+
+    prompt_hash = hashlib.sha256(podcast_prompt(text).encode("utf-8")).hexdigest()
+    key = hashlib.sha256(json.dumps([model_name, document_hash, prompt_hash]).encode("utf-8")).hexdigest()
+    path = podcast_script_cache.get(key)
+    if path:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                speaker1_lines, speaker2_lines = json.load(f)
+            print(f"info - Podcast script for {document_hash[:12]} served from the script cache")
+            return speaker1_lines, speaker2_lines
+        except (OSError, ValueError):
+            pass  # evicted by another worker meanwhile, or unreadable: regenerate
 
-    speaker1_voice="en-US-AvaNeural"
-    speaker2_voice="en-US-AndrewNeural"
-    pause="400ms"
-
-    ssml_parts = ['<speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" xml:lang="en-US">']
-    
-    for i in range(max(len(speaker1_lines), len(speaker2_lines))):
-        if i < len(speaker1_lines):
-            text = html.escape(speaker1_lines[i])
-            ssml_parts.append(f'  <voice name="{speaker1_voice}">')
-            ssml_parts.append(f'    {text}')
-            if i < len(speaker1_lines) - 1 or i < len(speaker2_lines):  # If more lines follow
-                ssml_parts.append(f'    <break time="{pause}" />')
-            ssml_parts.append('  </voice>')
-
-        if i < len(speaker2_lines):
-            text = html.escape(speaker2_lines[i])
-            ssml_parts.append(f'  <voice name="{speaker2_voice}">')
-            ssml_parts.append(f'    {text}')
-            if i < len(speaker2_lines) - 1 or i < len(speaker1_lines) - 1:  # If more lines follow
-                ssml_parts.append(f'    <break time="{pause}" />')
-            ssml_parts.append('  </voice>')
-
-    ssml_parts.append('</speak>')
-    return '\n'.join(ssml_parts)
+    print("Summarizing with Gemini...")
+    speaker1_lines, speaker2_lines = summarize_text_with_gemini(text)
+    try:
+        tmp_path = podcast_script_cache.temp_path()
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump([speaker1_lines, speaker2_lines], f)
+        podcast_script_cache.put(key, tmp_path)
+    except OSError as e:
+        print(f"error - Failed to cache podcast script: {e}")
+    return speaker1_lines, speaker2_lines
 
 
-def text_to_speech(text, output_file):
-    """Convert text to speech using Azure TTS and save as MP3."""
+def audio_cache_key(speaker1_lines, speaker2_lines):
+    """Identifies the synthesised audio: the whole script's SSML, the voices and the output format."""
+    material = json.dumps([
+        generate_ssml_for_two_speakers(speaker1_lines, speaker2_lines),
+        SPEAKER1_VOICE,
+        SPEAKER2_VOICE,
+        str(PODCAST_OUTPUT_FORMAT),
+    ])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def link_cached_audio(key, output_audio):
+    """Places the cached MP3 for key at output_audio; False if there is none."""
+    return podcast_audio_cache.get(key) is not None and podcast_audio_cache.link_into(key, output_audio)
+
+
+def cache_audio(key, output_audio):
+    try:
+        podcast_audio_cache.add(key, output_audio)
+    except OSError as e:
+        print(f"error - Failed to cache podcast audio: {e}")
 
-    # Create speech configuration
-    speech_config = speechsdk.SpeechConfig(subscription=speech_key, endpoint=endpoint)
 
-    # Set the audio output file
-    audio_config = speechsdk.audio.AudioOutputConfig(filename=output_file)
+def generate_ssml_for_two_speakers(speaker1_lines, speaker2_lines):
+    return ssml_for_turns(dialogue_turns(speaker1_lines, speaker2_lines))
+
 
-    synthesizer = speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=audio_config)
+def generate_ssml_segments(speaker1_lines, speaker2_lines, turns_per_segment=None):
+    """The same conversation as generate_ssml_for_two_speakers, split into SSML documents of a few turns each."""
+    return ssml_segments(dialogue_turns(speaker1_lines, speaker2_lines), turns_per_segment)
 
-    result = synthesizer.speak_ssml_async(text).get()
 
+def make_synthesizer():
+    """An in-memory (no audio device, no file) MP3 synthesiser."""
+    speech_config = speechsdk.SpeechConfig(subscription=speech_key, endpoint=endpoint)
+    speech_config.set_speech_synthesis_output_format(PODCAST_OUTPUT_FORMAT)
+    return speechsdk.SpeechSynthesizer(speech_config=speech_config, audio_config=None)
+
+
+def synthesize_with(synthesizer, ssml):
+    """Synthesises SSML with one pooled synthesiser and returns the MP3 bytes."""
+    result = synthesizer.speak_ssml_async(ssml).get()
     if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
-        print("Speech synthesized and saved to conversation_output.mp3")
-    elif result.reason == speechsdk.ResultReason.Canceled:
-        cancellation_details = result.cancellation_details
-        print(f"Speech synthesis canceled: {cancellation_details.reason}")
-        if cancellation_details.error_details:
-            print(f"Error details: {cancellation_details.error_details}")
+        return result.audio_data
+    details = result.cancellation_details if result.reason == speechsdk.ResultReason.Canceled else None
+    raise RuntimeError(f"Speech synthesis canceled: {details.reason if details else result.reason}"
+                       + (f" ({details.error_details})" if details and details.error_details else ""))
 
 
-def create_audio(input_file, output_audio):
-    print("Summarizing with Gemini...")
-    summarized_text_sp1, summarized_text_sp2 = summarize_text_with_gemini(input_file)
-    
-    ssml = generate_ssml_for_two_speakers(summarized_text_sp1, summarized_text_sp2)
+# Synthesisers are reused across segments and requests (each holds a service connection)
+synthesizer_pool = SynthesizerPool(make_synthesizer)
+
 
-    text_to_speech(ssml, output_audio)
+def text_to_speech(text, output_file):
+    """
+    Convert text to speech using Azure TTS and save as MP3. text is one SSML document, or a list of
+    SSML segments: those are synthesised concurrently by the synthesiser pool and joined in order.
+    """
+    segments = [text] if isinstance(text, str) else list(text)
+    audio = concat_mp3(list(synthesize_segments(segments, synthesize_with, synthesizer_pool)))
+
+    # Written next to the target and renamed, so readers never see a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(output_file) or ".", prefix=".tts-")
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            out.write(audio)
+        os.replace(tmp_path, output_file)
+    except Exception:
+        os.unlink(tmp_path)
+        raise
+    print(f"Speech synthesized and saved to {output_file}")
+
+
+def stream_audio(input_file, output_audio, turns_per_segment=None, document_hash=None):
+    """
+    Progressive create_audio: summarises the text, then synthesises the dialogue a few turns at a
+    time (later segments in parallel with earlier ones) and yields each segment's MP3 bytes, in
+    order, as soon as it is ready, so playback can start after the first turns. The complete file
+    is written to output_audio (atomically) once every segment is done; an interrupted stream
+    leaves no file behind. Audio already in the audio cache is streamed from there.
+    """
+    turns_per_segment = turns_per_segment or PODCAST_STREAM_TURNS
+    summarized_text_sp1, summarized_text_sp2 = podcast_script(input_file, document_hash)
+    audio_key = audio_cache_key(summarized_text_sp1, summarized_text_sp2)
+    if link_cached_audio(audio_key, output_audio):
+        print("info - Podcast audio served from the audio cache")
+        with open(output_audio, 'rb') as f:
+            yield from iter(lambda: f.read(64 * 1024), b'')
+        return
+
+    segments = generate_ssml_segments(summarized_text_sp1, summarized_text_sp2, turns_per_segment)
+    partial_path = f"{output_audio}.partial-{os.getpid()}"
+    completed = False
+    try:
+        with open(partial_path, 'wb') as out:
+            for i, audio in enumerate(synthesize_segments(segments, synthesize_with, synthesizer_pool)):
+                audio = mp3_segment_body(audio, i == 0, i == len(segments) - 1)
+                out.write(audio)
+                yield audio
+        os.replace(partial_path, output_audio)
+        completed = True
+        cache_audio(audio_key, output_audio)
+        print("Podcast generated successfully!")
+    finally:
+        if not completed and os.path.exists(partial_path):
+            os.unlink(partial_path)
+
+
+def create_audio(input_file, output_audio, document_hash=None, checkpoint=None):
+    """
+    Writes the podcast for input_file to output_audio. document_hash (the source document's
+    content hash) enables the script cache; the audio cache is always consulted.
+    checkpoint(), if given, runs between the script and speech stages and may raise to stop.
+    """
+    summarized_text_sp1, summarized_text_sp2 = podcast_script(input_file, document_hash)
+    if checkpoint:
+        checkpoint()
+    audio_key = audio_cache_key(summarized_text_sp1, summarized_text_sp2)
+    if link_cached_audio(audio_key, output_audio):
+        print("info - Podcast audio served from the audio cache")
+        return
+
+    segments = generate_ssml_segments(summarized_text_sp1, summarized_text_sp2)
+
+    text_to_speech(segments, output_audio)
+    cache_audio(audio_key, output_audio)
     print("Podcast generated successfully!")
 
 
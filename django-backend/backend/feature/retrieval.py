@@ -0,0 +1,171 @@
+import os
+import re
+import sys
+import math
+import zlib
+from collections import Counter
+
+import numpy as np
+
+# Small English stopword list: enough to keep BM25 from matching on glue words
+STOPWORDS = frozenset("""
+a an and are as at be been but by can could did do does for from had has have how i if in into is it its
+may more most no not of on or our out so such than that the their them then there these they this those
+to too was we were what when where which while who why will with would you your
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in STOPWORDS and len(token) > 1]
+
+
+class BM25Index:
+    """Okapi BM25 over (heading, text) pairs; an inverted index keeps scoring proportional to the query's postings."""
+
+    def __init__(self, entries, k1=1.5, b=0.75):
+        self.k1, self.b = k1, b
+        self.keys = []
+        self.doc_lengths = []
+        self.postings = {}  # term -> [(entry number, term frequency), ...]
+        for key, text in entries:
+            tokens = tokenize(text)
+            entry_number = len(self.keys)
+            self.keys.append(key)
+            self.doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                self.postings.setdefault(term, []).append((entry_number, tf))
+
+        count = len(self.keys)
+        self.avg_length = (sum(self.doc_lengths) / count) if count else 0.0
+        self.idf = {
+            term: math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5))
+            for term, posting in self.postings.items()
+        }
+
+    def __len__(self):
+        return len(self.keys)
+
+    def scores(self, query):
+        """Returns {entry number: score} for entries sharing at least one term with the query."""
+        scores = {}
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for entry_number, tf in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[entry_number] / (self.avg_length or 1))
+                scores[entry_number] = scores.get(entry_number, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def top_n(self, query, n):
+        """The n best-matching keys, best first."""
+        scores = self.scores(query)
+        best = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:n]
+        return [self.keys[entry_number] for entry_number, _ in best]
+
+
+# Hashed feature space for VectorIndex: memory is (#headings x VECTOR_DIM) float32, e.g. 6,000 headings -> 48 MB
+VECTOR_DIM = int(os.getenv("VECTOR_DIM", 2048))
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def _features(text, dim):
+    """Word unigrams and bigrams; crc32 (unlike hash()) gives every worker process the same buckets."""
+    tokens = tokenize(text)
+    grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    return Counter(zlib.crc32(gram.encode("utf-8")) % dim for gram in grams)
+
+
+class VectorIndex:
+    """
+    TF-IDF vectors over hashed n-grams, one L2-normalised row per (heading, text) entry,
+    so a query is scored against every entry with a single matrix-vector product.
+    """
+
+    def __init__(self, entries, dim=None):
+        self.dim = dim or VECTOR_DIM
+        self.keys, rows, cols, vals = [], [], [], []
+        for key, text in entries:
+            row = len(self.keys)
+            self.keys.append(key)
+            for bucket, tf in _features(text, self.dim).items():
+                rows.append(row)
+                cols.append(bucket)
+                vals.append(1.0 + math.log(tf))
+
+        count = len(self.keys)
+        rows, cols, vals = np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64), np.array(vals, dtype=np.float32)
+        df = np.bincount(cols, minlength=self.dim).astype(np.float32)
+        self.idf = (np.log((1.0 + count) / (1.0 + df)) + 1.0).astype(np.float32)
+
+        self.matrix = np.zeros((count, self.dim), dtype=np.float32)
+        np.add.at(self.matrix, (rows, cols), vals * self.idf[cols])
+        norms = np.linalg.norm(self.matrix, axis=1, keepdims=True)
+        self.matrix /= np.where(norms == 0, 1.0, norms)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def query_vector(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for bucket, tf in _features(text, self.dim).items():
+            vector[bucket] = (1.0 + math.log(tf)) * self.idf[bucket]
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def top_n(self, query, n):
+        """[(key, cosine similarity), ...] for the n most similar entries with a positive score, best first."""
+        if not self.keys:
+            return []
+        scores = self.matrix @ self.query_vector(query)
+        n = min(n, len(self.keys))
+        best = np.argpartition(-scores, n - 1)[:n]
+        best = best[np.lexsort((best, -scores[best]))]
+        return [(self.keys[i], float(scores[i])) for i in best if scores[i] > 0]
+
+
+def section_snippet(section_text, max_sentences=3, max_chars=400):
+    """The opening sentences of a section, standing in for a Gemini summary on the no-LLM path."""
+    sentences = _SENTENCE_RE.split(section_text.strip())
+    snippet = " ".join(sentences[:max_sentences])
+    return snippet if len(snippet) <= max_chars else snippet[:max_chars].rsplit(" ", 1)[0] + "..."
+
+
+def measure_recall(json_folder, input_dir, curr_dir, texts, n=None):
+    """
+    Recall of the BM25 pre-filter against the per-document Gemini filter: for each selected text,
+    the share of headings picked by the LLM path that BM25's top-n candidates also contain.
+    """
+    from backend.feature.base_feature import BM25_CANDIDATES, extract_keywords_and_info, process_headings
+    from backend.feature.doc_index import get_document_index
+
+    n = BM25_CANDIDATES if n is None else n
+    index = get_document_index(json_folder, input_dir, curr_dir)
+    recalls = []
+    for text in texts:
+        keywords = extract_keywords_and_info(text)
+        llm_headings = set(process_headings(index.outline_lists(), keywords)) & set(index.headings)
+        bm25_headings = set(index.bm25().top_n(text, n))
+        if not llm_headings:
+            continue
+        recall = len(llm_headings & bm25_headings) / len(llm_headings)
+        recalls.append(recall)
+        print(f"recall {recall:.2f} ({len(llm_headings & bm25_headings)}/{len(llm_headings)}) for: {text[:60]!r}")
+    mean = sum(recalls) / len(recalls) if recalls else 0.0
+    print(f"mean recall@{n}: {mean:.3f} over {len(recalls)} selections")
+    return mean
+
+
+def main():
+    # python -m backend.feature.retrieval <temp_files dir> <past dir> <current dir> "<selected text>" [...]
+    if len(sys.argv) < 5:
+        print('Usage: python -m backend.feature.retrieval <temp_files dir> <past dir> <current dir> "<selected text>" [...]')
+        sys.exit(2)
+    measure_recall(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4:])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import os
+import html
+import queue
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+# Kept free of the Azure SDK import: the synthesiser is passed in, so all of this runs (and is tested) offline.
+
+SPEAKER1_VOICE = "en-US-AvaNeural"
+SPEAKER2_VOICE = "en-US-AndrewNeural"
+TURN_PAUSE = "400ms"
+
+# Dialogue turns per synthesised segment, and how many segments are synthesised at once
+TTS_SEGMENT_TURNS = int(os.getenv("TTS_SEGMENT_TURNS", 4))
+TTS_MAX_CONCURRENCY = int(os.getenv("TTS_MAX_CONCURRENCY", 4))
+
+
+def dialogue_turns(speaker1_lines, speaker2_lines):
+    """[(voice, line), ...] in speaking order: the speakers alternate, starting with speaker 1."""
+    turns = []
+    for i in range(max(len(speaker1_lines), len(speaker2_lines))):
+        if i < len(speaker1_lines):
+            turns.append((SPEAKER1_VOICE, speaker1_lines[i]))
+        if i < len(speaker2_lines):
+            turns.append((SPEAKER2_VOICE, speaker2_lines[i]))
+    return turns
+
+
+def ssml_for_turns(turns, pause_after_last=False):
+    """SSML for a run of dialogue turns, with a pause between turns (and after the last one if more follow)."""
+    ssml_parts = ['<speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" xml:lang="en-US">']
+    for i, (voice, line) in enumerate(turns):
+        ssml_parts.append(f'  <voice name="{voice}">')
+        ssml_parts.append(f'    {html.escape(line)}')
+        if i < len(turns) - 1 or pause_after_last:  # If more lines follow
+            ssml_parts.append(f'    <break time="{TURN_PAUSE}" />')
+        ssml_parts.append('  </voice>')
+    ssml_parts.append('</speak>')
+    return '\n'.join(ssml_parts)
+
+
+def ssml_segments(turns, turns_per_segment=None):
+    """
+    Splits the dialogue into SSML documents of turns_per_segment turns each. Every segment but the
+    last ends with the turn pause, so the stitched audio has the same rhythm as a single document.
+    """
+    turns_per_segment = turns_per_segment or TTS_SEGMENT_TURNS
+    segments = []
+    for start in range(0, len(turns), turns_per_segment):
+        segment = turns[start:start + turns_per_segment]
+        segments.append(ssml_for_turns(segment, pause_after_last=start + len(segment) < len(turns)))
+    return segments
+
+
+class SynthesizerPool:
+    """
+    A fixed number of reusable synthesiser instances, created on first use by factory().
+    acquire() hands one out exclusively and blocks while all of them are busy.
+    """
+
+    def __init__(self, factory, size=None):
+        self.factory = factory
+        self.size = size or TTS_MAX_CONCURRENCY
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def acquire(self):
+        synthesizer = None
+        try:
+            synthesizer = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if self._created < self.size:
+                    self._created += 1
+                    create = True
+                else:
+                    create = False
+            if create:
+                try:
+                    synthesizer = self.factory()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                synthesizer = self._idle.get()
+        try:
+            yield synthesizer
+        finally:
+            self._idle.put(synthesizer)
+
+
+def synthesize_segments(segments, synthesize, pool):
+    """
+    Synthesises SSML segments concurrently (at most pool.size at once) with synthesize(synthesizer, ssml)
+    and yields each segment's audio bytes in script order as soon as it and all earlier ones are done.
+    """
+    def run(ssml):
+        with pool.acquire() as synthesizer:
+            return synthesize(synthesizer, ssml)
+
+    executor = ThreadPoolExecutor(max_workers=pool.size, thread_name_prefix="tts")
+    try:
+        futures = [executor.submit(run, ssml) for ssml in segments]
+        for future in futures:
+            yield future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+# --- MP3 stitching ---
+# Segments of one output format are concatenated frame for frame (no decoding or re-encoding).
+# Only per-file metadata has to go: ID3v2 tags at the start of every segment but the first, ID3v1
+# tags at the end of every segment but the last, and every segment's Xing/Info header frame. An Info
+# frame's frame count and byte total describe its own segment only, so players would show the wrong
+# duration and seek to the wrong place; without one they time the constant-bitrate stream exactly.
+
+_BITRATES = {  # kbps by (MPEG-1?, bitrate index), layer III
+    True: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    False: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def _id3v2_length(data):
+    if len(data) >= 10 and data[:3] == b"ID3":
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        return 10 + size + (10 if data[5] & 0x10 else 0)
+    return 0
+
+
+def _frame_length(data, offset):
+    """Length of the MPEG layer III frame starting at offset, or 0 if there is no valid header there."""
+    if offset + 4 > len(data) or data[offset] != 0xFF or (data[offset + 1] & 0xE0) != 0xE0:
+        return 0
+    version = (data[offset + 1] >> 3) & 0x03
+    layer = (data[offset + 1] >> 1) & 0x03
+    bitrate_index = data[offset + 2] >> 4
+    rate_index = (data[offset + 2] >> 2) & 0x03
+    padding = (data[offset + 2] >> 1) & 0x01
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return 0
+    mpeg1 = version == 3
+    bitrate = _BITRATES[mpeg1][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+    return (144 if mpeg1 else 72) * bitrate // sample_rate + padding
+
+
+def _is_info_frame(data, offset, length):
+    frame = data[offset:offset + length]
+    return b"Xing" in frame[:64] or b"Info" in frame[:64]
+
+
+def mp3_segment_body(data, first, last):
+    """The part of one MP3 segment that goes into the joined stream, given its position."""
+    data = bytes(data)
+    tag_end = _id3v2_length(data)
+    start, end = tag_end, len(data)
+    length = _frame_length(data, start)
+    if length and _is_info_frame(data, start, length):
+        start += length
+    if not last and end - start >= 128 and data[end - 128:end - 125] == b"TAG":
+        end -= 128
+    return (data[:tag_end] if first else b"") + data[start:end]
+
+
+def concat_mp3(segments):
+    """Joins MP3 segments into one stream without re-encoding."""
+    last = len(segments) - 1
+    return b"".join(mp3_segment_body(data, i == 0, i == last) for i, data in enumerate(segments))
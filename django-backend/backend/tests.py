@@ -1,3 +1,425 @@
-from django.test import TestCase
+import os
+import time
+import random
+import sqlite3
+import tempfile
+import threading
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import fitz  # PyMuPDF
+from django.test import SimpleTestCase
+
+from backend.feature import base_feature, genai_util, ingest
+from backend.feature.file_cache import FileCache
+from backend.feature.job_store import JobStore
+from backend.feature.doc_index import folder_signature, get_document_index, invalidate_document_index
+from backend.feature.llm_cache import LLMCache
+from backend.feature.tts import (
+    TURN_PAUSE, SynthesizerPool, concat_mp3, dialogue_turns, mp3_segment_body, ssml_for_turns, ssml_segments,
+    synthesize_segments,
+)
+
+# One MPEG-2 layer III frame header (24 kHz, 48 kbps, mono), the output format the podcast uses: 144 bytes per frame
+FRAME_HEADER = b"\xff\xf3\x64\xc4"
+FRAME_LENGTH = 144
+
+
+def mp3_frame(fill):
+    return FRAME_HEADER + bytes([fill]) * (FRAME_LENGTH - len(FRAME_HEADER))
+
+
+def info_frame():
+    frame = bytearray(mp3_frame(0))
+    frame[21:25] = b"Info"
+    return bytes(frame)
+
+
+def id3v2_tag(size=20):
+    return b"ID3\x04\x00\x00" + bytes([0, 0, 0, size]) + b"\x00" * size
+
+
+def id3v1_tag():
+    return b"TAG" + b"\x00" * 125
+
+
+class FakeSynthesizer:
+    """Stands in for an Azure SpeechSynthesizer: 'renders' SSML as an MP3 frame tagged with the segment's text."""
+
+    def __init__(self, tracker):
+        self.tracker = tracker
+        self.calls = 0
+
+    def synthesize(self, ssml):
+        with self.tracker.lock:
+            self.tracker.active += 1
+            self.tracker.peak = max(self.tracker.peak, self.tracker.active)
+        try:
+            time.sleep(random.uniform(0.001, 0.02))
+            self.calls += 1
+            return id3v2_tag() + info_frame() + ssml.encode("utf-8") + id3v1_tag()
+        finally:
+            with self.tracker.lock:
+                self.tracker.active -= 1
+
+
+class Tracker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+        self.instances = []
+
+    def factory(self):
+        synthesizer = FakeSynthesizer(self)
+        with self.lock:
+            self.instances.append(synthesizer)
+        return synthesizer
+
+
+def synthesize(synthesizer, ssml):
+    return synthesizer.synthesize(ssml)
+
+
+class SegmentedSynthesisTests(SimpleTestCase):
+    def setUp(self):
+        self.speaker1 = [f"Speaker one, line {i}." for i in range(7)]
+        self.speaker2 = [f"Speaker two, line {i}." for i in range(6)]
+        self.turns = dialogue_turns(self.speaker1, self.speaker2)
+
+    def test_segments_are_returned_in_script_order(self):
+        tracker = Tracker()
+        segments = ssml_segments(self.turns, turns_per_segment=2)
+        audio = list(synthesize_segments(segments, synthesize, SynthesizerPool(tracker.factory, size=3)))
+        self.assertEqual(len(audio), len(segments))
+        for ssml, data in zip(segments, audio):
+            self.assertIn(ssml.encode("utf-8"), data)
+
+    def test_pause_follows_every_turn_but_the_last(self):
+        segments = ssml_segments(self.turns, turns_per_segment=3)
+        self.assertEqual(len(segments), 5)
+        for ssml in segments[:-1]:
+            self.assertTrue(ssml.rstrip().endswith(f'<break time="{TURN_PAUSE}" />\n  </voice>\n</speak>'))
+        self.assertNotIn("<break", segments[-1].split("<voice")[-1])
+
+        # Split or not, the script has one pause between every pair of consecutive turns
+        single = ssml_for_turns(self.turns)
+        self.assertEqual(single.count("<break"), len(self.turns) - 1)
+        self.assertEqual(sum(ssml.count("<break") for ssml in segments), len(self.turns) - 1)
+
+    def test_concurrency_is_bounded_by_the_pool(self):
+        tracker = Tracker()
+        pool = SynthesizerPool(tracker.factory, size=2)
+        segments = ssml_segments(self.turns, turns_per_segment=1)
+        list(synthesize_segments(segments, synthesize, pool))
+        list(synthesize_segments(segments, synthesize, pool))
+        self.assertLessEqual(tracker.peak, 2)
+        self.assertLessEqual(len(tracker.instances), 2)
+        # The instances are reused across segments and across calls
+        self.assertEqual(sum(s.calls for s in tracker.instances), 2 * len(segments))
+
+    def test_failed_factory_does_not_use_up_the_pool(self):
+        attempts = []
+
+        def factory():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise RuntimeError("service unavailable")
+            return object()
+
+        pool = SynthesizerPool(factory, size=1)
+        with self.assertRaises(RuntimeError):
+            with pool.acquire():
+                pass
+        with pool.acquire() as synthesizer:
+            self.assertIsNotNone(synthesizer)
+
+    def test_concat_strips_per_file_metadata_without_reencoding(self):
+        first = id3v2_tag() + info_frame() + mp3_frame(1) + id3v1_tag()
+        middle = id3v2_tag() + info_frame() + mp3_frame(2) + id3v1_tag()
+        last = id3v2_tag() + info_frame() + mp3_frame(3) + id3v1_tag()
+        joined = concat_mp3([first, middle, last])
+        # No Info frame survives: the first segment's would describe only that segment's frames
+        self.assertEqual(joined, id3v2_tag() + mp3_frame(1) + mp3_frame(2) + mp3_frame(3) + id3v1_tag())
+
+    def test_streamed_segments_match_the_joined_file(self):
+        segments = [id3v2_tag() + info_frame() + mp3_frame(n) + id3v1_tag() for n in (1, 2, 3)]
+        streamed = b"".join(mp3_segment_body(data, i == 0, i == len(segments) - 1) for i, data in enumerate(segments))
+        self.assertEqual(streamed, concat_mp3(segments))
+        self.assertNotIn(b"Info", streamed)
+
+    def test_concat_keeps_segments_without_metadata_intact(self):
+        segments = [mp3_frame(1), mp3_frame(2)]
+        self.assertEqual(concat_mp3(segments), b"".join(segments))
+
+
+def make_pdf(path, pages):
+    """A small PDF with a heading and a few body lines per page, in two font sizes."""
+    doc = fitz.open()
+    for number in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 80), f"Chapter {number + 1} Overview", fontsize=16)
+        for line in range(6):
+            page.insert_text((72, 110 + 16 * line), f"Body text of page {number + 1}, line {line + 1} of the chapter.", fontsize=10)
+    doc.save(path)
+    doc.close()
+
+
+class IngestTests(SimpleTestCase):
+    def setUp(self):
+        scratch = tempfile.TemporaryDirectory()
+        self.addCleanup(scratch.cleanup)
+        self.scratch = scratch.name
+        self.pdf_path = os.path.join(self.scratch, "guide.pdf")
+        make_pdf(self.pdf_path, pages=5)
+
+    @classmethod
+    def tearDownClass(cls):
+        if ingest._pool is not None:
+            ingest.retire_pool(ingest._pool)
+        super().tearDownClass()
+
+    def test_sharded_parse_matches_sequential_parse(self):
+        self.assertTrue(ingest.check_sharded_parse(self.pdf_path, shard_pages=2, workers=2, timeout=60))
+
+    def test_parse_cache_counts_lookups_made_in_pool_workers(self):
+        cache = FileCache(os.path.join(self.scratch, "parse_cache"), 1024 * 1024, suffix=".pdoc")
+        for attempt in range(2):
+            output_dir = os.path.join(self.scratch, f"parsed-{attempt}")
+            os.makedirs(output_dir)
+            self.assertEqual(ingest.parse_documents([self.pdf_path], output_dir, cache=cache, workers=2, timeout=60), {})
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1, "hit_rate": 0.5})
+
+    def test_retiring_the_pool_lets_other_batches_finish(self):
+        with ingest.borrowed_pool(2) as pool:
+            other_batch = pool.apply_async(time.sleep, (0.5,))
+            with ingest.borrowed_pool(2) as stuck_batch_pool:
+                self.assertIs(stuck_batch_pool, pool)
+                ingest.retire_pool(pool)
+            # Still in use: the other batch's parse runs to completion
+            other_batch.get(timeout=30)
+            self.assertTrue(other_batch.successful())
+        with ingest.borrowed_pool(2) as fresh:
+            self.assertIsNot(fresh, pool)
+
+    def test_single_worker_parse_from_a_thread(self):
+        # The server parses uploads on a background thread, where SIGALRM cannot be installed
+        output_dir = os.path.join(self.scratch, "parsed")
+        os.makedirs(output_dir)
+        states, outcome = [], {}
+
+        def run():
+            try:
+                outcome["failures"] = ingest.parse_documents(
+                    [self.pdf_path], output_dir, workers=1, timeout=60,
+                    on_state=lambda pdf_path, state, error=None: states.append(state),
+                )
+            except Exception as e:
+                outcome["error"] = e
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join(120)
+        self.assertNotIn("error", outcome)
+        self.assertEqual(outcome["failures"], {})
+        self.assertEqual(states, ["parsing", "ready"])
+        self.assertEqual(len(os.listdir(output_dir)), 1)
+
+
+class JobStoreTests(SimpleTestCase):
+    def setUp(self):
+        scratch = tempfile.TemporaryDirectory()
+        self.addCleanup(scratch.cleanup)
+        self.path = os.path.join(scratch.name, "jobs.sqlite3")
+        self.store = JobStore(self.path, 60)
+
+    def test_document_text_is_kept_out_of_the_polled_result(self):
+        job_id = self.store.reset("s")
+        self.store.update("s", lambda entry: entry.update(results={"key_insights": []}), job_id=job_id, text="Full text")
+        self.store.update("s", lambda entry: entry.update(podcast="a.mp3"), job_id=job_id)
+        self.assertEqual(self.store.get("s")["result"], {"results": {"key_insights": []}, "podcast": "a.mp3"})
+        self.assertEqual(self.store.get_text("s"), "Full text")
+        # A superseded job's text is dropped with its results, and a new job starts without text
+        self.assertFalse(self.store.update("s", lambda entry: None, job_id="old", text="Stale text"))
+        self.store.reset("s")
+        self.assertIsNone(self.store.get_text("s"))
+
+    def test_store_without_the_text_column_is_upgraded(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("CREATE TABLE jobs (session_id TEXT PRIMARY KEY, job_id TEXT NOT NULL, state TEXT NOT NULL, "
+                     "result TEXT NOT NULL, owner TEXT NOT NULL, created REAL NOT NULL, updated REAL NOT NULL)")
+        conn.execute("INSERT INTO jobs VALUES ('s', 'j', 'done', '{\"file_name\": \"a.pdf\"}', 'host:1', 0, 0)")
+        conn.commit()
+        conn.close()
+        self.assertEqual(self.store.get("s")["result"], {"file_name": "a.pdf"})
+        self.assertTrue(self.store.update("s", lambda entry: None, job_id="j", text="Full text"))
+        self.assertEqual(self.store.get_text("s"), "Full text")
+
+
+class FolderSignatureTests(SimpleTestCase):
+    def setUp(self):
+        scratch = tempfile.TemporaryDirectory()
+        self.addCleanup(scratch.cleanup)
+        self.folder = scratch.name
+        self.path = os.path.join(self.folder, "guide.pdoc")
+        with open(self.path, "w") as f:
+            f.write("parsed")
+
+    def test_touching_a_shared_file_keeps_the_signature(self):
+        # Parse cache hits in other sessions bump the mtime of the hard-linked file
+        signature = folder_signature(self.folder)
+        os.utime(self.path, ns=(time.time_ns() + 10**9, time.time_ns() + 10**9))
+        self.assertEqual(folder_signature(self.folder), signature)
+
+    def test_replacing_a_document_changes_the_signature(self):
+        signature = folder_signature(self.folder)
+        replacement = os.path.join(self.folder, "guide.pdoc.tmp")
+        with open(replacement, "w") as f:
+            f.write("parsed")
+        os.replace(replacement, self.path)
+        self.assertNotEqual(folder_signature(self.folder), signature)
+
+
+class DocumentIndexTests(SimpleTestCase):
+    def setUp(self):
+        scratch = tempfile.TemporaryDirectory()
+        self.addCleanup(scratch.cleanup)
+        self.past_dir = os.path.join(scratch.name, "past")
+        self.curr_dir = os.path.join(scratch.name, "current")
+        self.json_folder = os.path.join(self.past_dir, "temp_files")
+        for folder in (self.curr_dir, self.json_folder):
+            os.makedirs(folder)
+        self.pdf_path = os.path.join(self.past_dir, "guide.pdf")
+        make_pdf(self.pdf_path, pages=3)
+        base_feature.create_output_json(self.pdf_path, self.json_folder)
+        self.addCleanup(invalidate_document_index, self.json_folder)
+
+    def test_index_is_built_from_a_parsed_pdf(self):
+        index = get_document_index(self.json_folder, self.past_dir, self.curr_dir)
+        self.assertEqual(index.outline_lists(), [["Chapter 1 Overview", "Chapter 2 Overview", "Chapter 3 Overview"]])
+        entry = index.headings["Chapter 2 Overview"]
+        self.assertEqual((entry["document"], entry["local_path"], entry["page_number"]), ("guide.pdf", self.pdf_path, 1))
+        self.assertIn("Body text of page 2", entry["section_text"])
+        self.assertIs(get_document_index(self.json_folder, self.past_dir, self.curr_dir), index)
+
+    def test_moving_a_pdf_between_past_and_current_rebuilds_the_index(self):
+        index = get_document_index(self.json_folder, self.past_dir, self.curr_dir)
+        moved = os.path.join(self.curr_dir, "guide.pdf")
+        os.replace(self.pdf_path, moved)
+        rebuilt = get_document_index(self.json_folder, self.past_dir, self.curr_dir)
+        self.assertIsNot(rebuilt, index)
+        self.assertEqual(rebuilt.headings["Chapter 1 Overview"]["local_path"], moved)
+
+    def test_parsed_document_without_its_pdf_is_left_out(self):
+        orphan = os.path.join(self.past_dir, "orphan.pdf")
+        make_pdf(orphan, pages=1)
+        base_feature.create_output_json(orphan, self.json_folder)
+        os.unlink(orphan)
+        index = get_document_index(self.json_folder, self.past_dir, self.curr_dir)
+        self.assertEqual(index.outline_lists(), [["Chapter 1 Overview", "Chapter 2 Overview", "Chapter 3 Overview"]])
+
+
+class LLMResponseCachingTests(SimpleTestCase):
+    def setUp(self):
+        scratch = tempfile.TemporaryDirectory()
+        self.addCleanup(scratch.cleanup)
+        self.cache = LLMCache(os.path.join(scratch.name, "llm.sqlite3"), 1024 * 1024, 3600)
+        self.responses = []
+        models = SimpleNamespace(generate_content=lambda **kwargs: SimpleNamespace(text=self.responses.pop(0)))
+        for patcher in (mock.patch.object(base_feature, "llm_cache", self.cache),
+                        mock.patch.object(base_feature, "client", SimpleNamespace(models=models))):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_unparseable_response_is_not_cached(self):
+        self.responses = ["Sorry, I can't help with that.", "```python\n['Louvre', 'Orsay']\n```"]
+        self.assertEqual(base_feature.call_gemini_api("system", "user"), [])
+        self.assertEqual(base_feature.call_gemini_api("system", "user"), ["Louvre", "Orsay"])
+        # The parsed answer is cached: no third model call
+        self.assertEqual(base_feature.call_gemini_api("system", "user"), ["Louvre", "Orsay"])
+        self.assertEqual(self.responses, [])
+
+    def test_only_complete_relevant_sections_are_cacheable(self):
+        section = {"section_title": "Louvre", "refined_text": "A museum in Paris."}
+        self.assertTrue(base_feature.is_complete_result({"extracted_sections": [section]}))
+        self.assertFalse(base_feature.is_complete_result(None))
+        self.assertFalse(base_feature.is_complete_result({"extracted_sections": []}))
+        failed = {"section_title": "Orsay", "refined_text": f"{base_feature.SUMMARY_FAILED_PREFIX}Orsay"}
+        self.assertFalse(base_feature.is_complete_result({"extracted_sections": [section, failed]}))
+
+    def test_streamed_category_is_cached_only_when_it_parses(self):
+        responses = ["Sorry, I can't help with that.", "['Louvre', 'Orsay']"]
+
+        def generate_content(prompt, generation_config=None, stream=False):
+            text = responses.pop(0)
+            return [SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[SimpleNamespace(text=text)]))])]
+
+        def run():
+            events = genai_util.queue.Queue()
+            genai_util.stream_category("did_you_know", "prompt", events)
+            return [event for event in iter(events.get, None)][-1]
+
+        with mock.patch.object(genai_util, "llm_cache", self.cache), \
+                mock.patch.object(genai_util, "gemini_model", SimpleNamespace(generate_content=generate_content)):
+            self.assertEqual(run()[1]["items"], "Sorry, I can't help with that.")
+            self.assertEqual(run()[1]["items"], ["Louvre", "Orsay"])
+            self.assertEqual(run()[1]["items"], ["Louvre", "Orsay"])
+        self.assertEqual(responses, [])
+
+    def test_hung_category_does_not_block_the_insights_stream(self):
+        def stream_category(category, prompt, events, use_cache=True):
+            if category != "counterpoints":  # counterpoints never answers
+                events.put(("category", {"category": category, "items": [category]}))
+                events.put(None)
+
+        with mock.patch.object(genai_util, "extract_pages_from_document", return_value=["Some text."]), \
+                mock.patch.object(genai_util, "stream_category", stream_category), \
+                mock.patch.object(genai_util, "INSIGHTS_STREAM_IDLE_SECONDS", 0.2):
+            events = list(genai_util.stream_insights("folder", "guide.pdf"))
+        self.assertIn(("category_error", {"category": "counterpoints", "error": "Timed out waiting for the model."}), events)
+        self.assertEqual(events[-1], ("done", {"results": {"key_insights": ["key_insights"], "did_you_know": ["did_you_know"],
+                                                           "counterpoints": None}}))
+
+
+def guide_pages(count):
+    """Pages of varying length (roughly 250 to 1000 tokens each)."""
+    return [
+        f"Page {n} of the guide. "
+        + " ".join(f"The harbour town number {n} has sight {i} worth a visit." for i in range(20 + (n * 37) % 60))
+        + "\n"
+        for n in range(count)
+    ]
+
+
+class MapReduceChunkingTests(SimpleTestCase):
+    def test_chunks_cover_the_pages_in_order(self):
+        pages = guide_pages(40)
+        spans = genai_util.chunk_page_spans(pages, 2000)
+        self.assertGreater(len(spans), 1)
+        self.assertEqual([first for first, _, _ in spans], [0] + [last + 1 for _, last, _ in spans[:-1]])
+        for first, last, text in spans:
+            self.assertEqual(text, "".join(pages[first:last + 1]))
+
+    def test_editing_a_page_leaves_the_other_chunks_unchanged(self):
+        pages = guide_pages(40)
+        spans = genai_util.chunk_page_spans(pages, 2000)
+        for edited in (3, 17, 31):
+            changed_pages = list(pages)
+            changed_pages[edited] += "A new paragraph was added to this page after the first upload."
+            new_chunks = set(genai_util.chunk_pages(changed_pages, 2000))
+            own = next(i for i, (first, last, _) in enumerate(spans) if first <= edited <= last)
+            changed = [i for i, (_, _, text) in enumerate(spans) if text not in new_chunks]
+            # The edited page's chunk changes; if the page no longer ends a chunk, the next one does too
+            self.assertIn(own, changed)
+            self.assertLessEqual(set(changed), {own, own + 1})
+
+    def test_pages_left_out_by_the_chunk_cap_are_reported(self):
+        pages = guide_pages(40)
+        spans = genai_util.chunk_page_spans(pages, 2000)
+        insights = {category: [f"{category} item"] for category in genai_util.INSIGHT_CATEGORIES}
+        with mock.patch.object(genai_util, "query_insights_structured", return_value=insights), \
+                mock.patch.object(genai_util, "query_structured", return_value=dict(insights)):
+            results = genai_util.map_reduce_insights(pages, chunk_tokens=2000, max_chunks=4)
+        kept = [spans[int(i * len(spans) / 4)] for i in range(4)]
+        analysed = {page + 1 for first, last, _ in kept for page in range(first, last + 1)}
+        self.assertEqual(results["skipped_pages"], sorted(set(range(1, 41)) - analysed))
@@ -6,6 +6,12 @@ urlpatterns = [
     path('', views.home),
     path('upload_documents/' , view= views.uploadPdf , name = 'upload-pdfs'),
     path("find_relevant_sections/" , view = views.Get_Relevant_Topics , name = "Get_base_logic") ,
+    path("find_relevant_sections/stream/" , view = views.Get_Relevant_Topics_Stream , name = "Get_base_logic_stream") ,
     path("get_insights/" , view = views.generate_insights , name = "Generate_Insights" ),
-    path("generate_audio_podcast/" , view = views.podcast , name = "Podcast_generation")
+    path("get_insights/stream/" , view = views.generate_insights_stream , name = "Generate_Insights_stream" ),
+    path("generate_audio_podcast/" , view = views.podcast , name = "Podcast_generation"),
+    path("generate_audio_podcast/stream/" , view = views.podcast_stream , name = "Podcast_generation_stream"),
+    path("ingest_status/" , view = views.ingest_status , name = "Ingest_status"),
+    path("documents/" , view = views.session_documents , name = "Session_documents"),
+    path("cache_stats/" , view = views.cache_stats , name = "Cache_stats")
 ]
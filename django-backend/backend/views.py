@@ -1,8 +1,8 @@
 import shutil
 from django.conf import settings
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from rest_framework.decorators import api_view, parser_classes
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
 from rest_framework.response import Response
 from rest_framework import status
 from django.http import FileResponse, Http404
@@ -10,23 +10,103 @@ import mimetypes
 from dotenv import load_dotenv
 import os 
 import re
+import json
+import uuid
+import hashlib
 import logging
+import functools
 import threading
 import time
+import fcntl
+from contextlib import contextmanager
+from urllib.parse import quote
 
-from backend.feature.genai_util import process_document
-from backend.feature.podcast import create_audio
+from backend.feature.genai_util import (
+    INSIGHT_CATEGORIES, condense_for_prompt, extract_text_from_document, process_document, stream_insights,
+)
+from backend.feature.podcast import create_audio, podcast_audio_cache, podcast_script_cache, stream_audio
+from backend.feature.job_store import JobSuperseded, job_store
+from concurrent.futures import ThreadPoolExecutor
 
-# --- Session processing state ---
-session_processing_results = {}
-session_processing_threads = {}
-session_processing_locks = {}
+# --- Background insights + podcast jobs ---
+# A fixed number of jobs run at once per worker process; the rest wait in the executor's queue
+PROCESSING_WORKERS = int(os.getenv("PROCESSING_WORKERS", 2))
+processing_executor = ThreadPoolExecutor(max_workers=PROCESSING_WORKERS, thread_name_prefix="insights")
+# get_insights / generate_audio_podcast answer 202 + progress while a job is in flight; ?wait=N holds the
+# request up to N seconds for the result, capped well below nginx's 60 s read and gunicorn's 120 s timeouts
+LONG_POLL_MAX_SECONDS = int(os.getenv("LONG_POLL_MAX_SECONDS", 25))
+POLL_RETRY_AFTER_SECONDS = 2
+# A failed podcast is reported (not retried) to requests arriving within this long of the failure
+PODCAST_RETRY_AFTER_FAILURE_SECONDS = 60
 
-# ADD THIS: Global lock for thread-safe dictionary access
-processing_data_lock = threading.Lock()
+def store_session_result(session_id, job_id, state, result=None, text=None, **fields):
+    """
+    Writes the session's job result in the shared job store: replaces it with result if given, then sets fields.
+    The document text goes in its own column, so job polls don't read it. With a job_id, nothing
+    is written once that job has been superseded.
+    """
+    def mutate(entry):
+        if result is not None:
+            entry.clear()
+            entry.update(result)
+        entry.update(fields)
+    return job_store.update(session_id, mutate, job_id=job_id, state=state, text=text)
 
-def process_pdf_for_session(session_id):
-    """Process the PDF for a session and store the result + generate podcast automatically."""
+def get_session_result(session_id):
+    job = job_store.get(session_id)
+    return (job["result"] or None) if job else None
+
+def make_session_podcast(session_id, job_id, file_name, results, checkpoint):
+    """Generates the podcast for the session's job_id and records it (or the failure) in the job store."""
+    past_folder = get_session_folder(session_id, "past")
+    try:
+        audio_dir = os.path.join(past_folder, "audio_files")
+        os.makedirs(audio_dir, exist_ok=True)
+        # Per-job file name, so a superseded job still synthesising can't overwrite a newer podcast
+        audio_loc = os.path.join(audio_dir, file_name.replace('.pdf', f'_{job_id[:8]}.mp3'))
+
+        print(f"info - Generating podcast for session {session_id}")
+        create_audio(
+            condense_for_prompt(past_folder, file_name, results), audio_loc,
+            document_hash=get_document_sha256(session_id, file_name),
+            checkpoint=checkpoint,
+        )
+
+        # Update with podcast path
+        def mutate(entry):
+            entry.pop("podcast_error", None)
+            entry.pop("podcast_failed_at", None)
+            entry["podcast"] = audio_loc
+        if job_store.update(session_id, mutate, job_id=job_id, state="done"):
+            print(f"info - Podcast generated successfully for session {session_id}")
+        else:
+            os.unlink(audio_loc)
+            raise JobSuperseded(f"job {job_id} of session {session_id} was superseded")
+
+    except JobSuperseded:
+        raise
+    except Exception as e:
+        print(f"error - Failed to generate podcast for session {session_id}: {e}")
+        store_session_result(session_id, job_id, "done", podcast_error=str(e), podcast_failed_at=time.time())
+
+def generate_session_podcast(session_id, job_id):
+    """Podcast-only job for a session whose insights are done (requested after the podcast failed or was never made)."""
+    result = get_session_result(session_id) or {}
+    try:
+        make_session_podcast(
+            session_id, job_id, result["file_name"], result["results"],
+            lambda: job_store.checkpoint(session_id, job_id),
+        )
+    except JobSuperseded:
+        print(f"info - Podcast job {job_id} for session {session_id} was superseded; discarding it")
+    except Exception as e:
+        store_session_result(session_id, job_id, "done", podcast_error=str(e), podcast_failed_at=time.time())
+
+def process_pdf_for_session(session_id, job_id):
+    """
+    Process the PDF for a session and store the result + generate podcast automatically (job_id must be claimed).
+    A re-upload supersedes the job: it stops at the next stage boundary and its results are discarded.
+    """
     past_folder = get_session_folder(session_id, "past")
     current_folder = get_session_folder(session_id, "current")
     file_name = None
@@ -39,58 +119,34 @@ def process_pdf_for_session(session_id):
                 break
     
     if not file_name:
-        with processing_data_lock:
-            session_processing_results[session_id] = {"error": "No PDF file found in session current folder."}
+        store_session_result(session_id, job_id, "failed", {"error": "No PDF file found in session current folder."})
         return
     
+    def checkpoint():
+        job_store.checkpoint(session_id, job_id)
+
     try:
-        # Always search for the JSON in the past folder's temp_files
+        # Superseded while queued: don't start at all
+        checkpoint()
+        # Always search for the parsed document in the past folder's temp_files
         results, text = process_document(past_folder, file_name)
+        checkpoint()
         if not results:
-            with processing_data_lock:
-                session_processing_results[session_id] = {"error": "Invalid Document or file name"}
+            store_session_result(session_id, job_id, "failed", {"error": "Invalid Document or file name"})
         else:
-            # Store insights results - THREAD SAFE
-            with processing_data_lock:
-                session_processing_results[session_id] = {
-                    "results": results, 
-                    "text": text,
-                    "file_name": file_name
-                }
+            # Store insights results - visible to every worker; the job runs on for the podcast
+            store_session_result(session_id, job_id, "running", {
+                "results": results, 
+                "file_name": file_name
+            }, text=text)
             
             # NEW: Automatically generate podcast after insights are ready
-            try:
-                audio_dir = os.path.join(past_folder, "audio_files")
-                os.makedirs(audio_dir, exist_ok=True)
-                audio_loc = os.path.join(audio_dir, file_name.replace('.pdf', '.mp3'))
-                
-                print(f"info - Generating podcast for session {session_id}")
-                create_audio(f"{text} \n {results}", audio_loc)
-                
-                # Update with podcast path - THREAD SAFE
-                with processing_data_lock:
-                    if session_id in session_processing_results:
-                        session_processing_results[session_id]['podcast'] = audio_loc
-                print(f"info - Podcast generated successfully for session {session_id}")
-                
-            except Exception as e:
-                print(f"error - Failed to generate podcast for session {session_id}: {e}")
-                with processing_data_lock:
-                    if session_id in session_processing_results:
-                        session_processing_results[session_id]['podcast_error'] = str(e)
-                
+            make_session_podcast(session_id, job_id, file_name, results, checkpoint)
+
+    except JobSuperseded:
+        print(f"info - Insights job {job_id} for session {session_id} was superseded; discarding its results")
     except Exception as e:
-        with processing_data_lock:
-            session_processing_results[session_id] = {"error": str(e)}
-    finally:
-        # Release lock if present - THREAD SAFE 
-        with processing_data_lock:
-            lock = session_processing_locks.get(session_id)
-            if lock:
-                lock.release()
-            # Remove thread reference for this session
-            if session_id in session_processing_threads:
-                del session_processing_threads[session_id]
+        store_session_result(session_id, job_id, "failed", {"error": str(e)})
 
 logger = logging.getLogger(__name__)
 
@@ -100,15 +156,35 @@ from .models import PdfFile
 from .serializers import PdfFileSerializer
 
 # Assuming main_functionality is in this path
-from backend.feature.base_feature import create_output_json, main_functionality
+from backend.feature.base_feature import (
+    RELEVANCE_MODE, RELEVANCE_MODES, is_complete_result, main_functionality, parsed_document_path, stream_relevant_sections
+)
+from backend.feature.ingest import parse_documents
+from backend.feature.file_cache import FileCache, sha256_file
+from backend.feature.llm_cache import llm_cache
+from backend.feature.doc_format import DOC_SUFFIX
+from backend.feature.doc_index import get_document_index, invalidate_document_index
 
 # --- Session-based file management config ---
 SESSION_BASE_DIR = os.path.join(settings.MEDIA_ROOT, "PDFsUploaded", "sessions")
 SESSION_TIMEOUT_SECONDS = 60 * 60  # 1 hour
 CLEANUP_INTERVAL_SECONDS = 10 * 60  # 10 minutes
 
-def get_session_id(request):
-    session_id = request.META.get('HTTP_X_SESSION_ID')
+# --- Parse cache config (shared by all sessions, untouched by session cleanup) ---
+PARSE_CACHE_DIR = os.path.join(settings.MEDIA_ROOT, "cache", "parsed")
+PARSE_CACHE_MAX_BYTES = int(os.getenv("PARSE_CACHE_MAX_BYTES", 512 * 1024 * 1024))  # 512 MB
+parse_cache = FileCache(PARSE_CACHE_DIR, PARSE_CACHE_MAX_BYTES, suffix=DOC_SUFFIX)
+
+# --- Audio serving config ---
+# When set (e.g. "/protected-media/", an nginx internal location aliasing MEDIA_ROOT), podcast audio is
+# sent by nginx via X-Accel-Redirect instead of occupying a gunicorn worker for the whole transfer
+PODCAST_ACCEL_REDIRECT_PREFIX = os.getenv("PODCAST_ACCEL_REDIRECT_PREFIX", "")
+AUDIO_CHUNK_SIZE = 64 * 1024
+
+def get_session_id(request, allow_query=False):
+    # Media elements (<audio src=...>) cannot send headers, so only the audio stream passes allow_query
+    # and also accepts ?session_id=; everywhere else a session id in a URL (logs, Referer) is refused
+    session_id = request.META.get('HTTP_X_SESSION_ID') or (request.GET.get('session_id') if allow_query else None)
     if not session_id:
         raise ValueError("Session ID (x-session-id) header is required.")
     # Sanitize session_id to avoid path traversal
@@ -122,6 +198,9 @@ def get_session_folder(session_id, category):
 def get_temp_files_folder(session_id):
     return os.path.join(SESSION_BASE_DIR, session_id, "past", "temp_files")
 
+def get_parsed_document_path(session_id, pdf_name):
+    return os.path.join(get_temp_files_folder(session_id), pdf_name.replace('.pdf', DOC_SUFFIX))
+
 def update_last_accessed(session_id):
     session_dir = os.path.join(SESSION_BASE_DIR, session_id)
     os.makedirs(session_dir, exist_ok=True)
@@ -137,6 +216,145 @@ def get_last_accessed(session_dir):
     except Exception:
         return None
 
+@contextmanager
+def session_file_lock(session_id, name):
+    """
+    Serialises read-modify-write of a session's ingest_status.json / manifest.json across threads
+    and gunicorn workers: an exclusive flock on <name>.lock in the session folder.
+    """
+    lock_path = os.path.join(SESSION_BASE_DIR, session_id, f"{name}.lock")
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    with open(lock_path, "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def get_ingest_status_path(session_id):
+    return os.path.join(SESSION_BASE_DIR, session_id, "ingest_status.json")
+
+def read_ingest_status(session_id):
+    try:
+        with open(get_ingest_status_path(session_id), "r") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+def write_json_atomic(path, data):
+    tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def write_ingest_status(session_id, ingest_status):
+    # Written to a file (not a module dict) so every gunicorn worker can answer status requests
+    write_json_atomic(get_ingest_status_path(session_id), ingest_status)
+
+def set_document_state(session_id, job_id, document, state, error=None, place=None):
+    """
+    Records one document's ingest state (queued / parsing / ready / failed) for the job.
+    place() runs under the same lock before the state is written, so a document's output is only
+    put in place while job_id still owns it. Returns False if the document moved on to another job.
+    """
+    with session_file_lock(session_id, "ingest_status"):
+        ingest_status = read_ingest_status(session_id)
+        if not ingest_status:
+            return False
+        entry = ingest_status["documents"].get(document)
+        if not entry or entry.get("job_id") != job_id:
+            return False  # removed, or re-queued by a newer upload
+        if place:
+            place()
+        ingest_status["documents"][document] = {"state": state, "error": error, "job_id": job_id}
+        ingest_status["updated_at"] = int(time.time())
+        write_ingest_status(session_id, ingest_status)
+        return True
+
+def owns_document(session_id, job_id, document):
+    ingest_status = read_ingest_status(session_id)
+    entry = ingest_status["documents"].get(document) if ingest_status else None
+    return bool(entry) and entry.get("job_id") == job_id
+
+def queue_documents(session_id, job_id, documents, replace_all=False):
+    """Marks documents as queued for job_id, keeping the other documents' states unless replace_all."""
+    with session_file_lock(session_id, "ingest_status"):
+        ingest_status = None if replace_all else read_ingest_status(session_id)
+        if not ingest_status:
+            ingest_status = {"created_at": int(time.time()), "documents": {}}
+        ingest_status["job_id"] = job_id
+        ingest_status["updated_at"] = int(time.time())
+        for document in documents:
+            ingest_status["documents"][document] = {"state": "queued", "error": None, "job_id": job_id}
+        write_ingest_status(session_id, ingest_status)
+
+def forget_document_state(session_id, document):
+    with session_file_lock(session_id, "ingest_status"):
+        ingest_status = read_ingest_status(session_id)
+        if ingest_status and ingest_status["documents"].pop(document, None) is not None:
+            write_ingest_status(session_id, ingest_status)
+
+# --- Per-session document manifest: {document name: {category, sha256}} ---
+def get_manifest_path(session_id):
+    return os.path.join(SESSION_BASE_DIR, session_id, "manifest.json")
+
+def read_manifest(session_id):
+    try:
+        with open(get_manifest_path(session_id), "r") as f:
+            return json.load(f)
+    except Exception:
+        return {"documents": {}}
+
+def write_manifest(session_id, manifest):
+    write_json_atomic(get_manifest_path(session_id), manifest)
+
+def get_manifest_hash(session_id):
+    """Hash of the session's document set; changes whenever a document is added, replaced or removed."""
+    documents = read_manifest(session_id)["documents"]
+    entries = sorted((name, doc["category"], doc["sha256"]) for name, doc in documents.items())
+    return hashlib.sha256(json.dumps(entries).encode("utf-8")).hexdigest()
+
+def get_document_sha256(session_id, name):
+    """Content hash of a session document (keys the shared podcast caches), or None if unknown."""
+    doc = read_manifest(session_id)["documents"].get(name)
+    return doc["sha256"] if doc else None
+
+def save_uploaded_pdf(file, folder, known_sha256=None):
+    """
+    Streams an uploaded PDF into folder while hashing it.
+    Returns (name, sha256, changed); an upload identical to known_sha256 leaves the folder untouched.
+    """
+    name = normalize_name(file.name)
+    final_path = os.path.join(folder, name)
+    tmp_path = f"{final_path}.upload-{os.getpid()}-{threading.get_ident()}"
+    digest = hashlib.sha256()
+    with open(tmp_path, 'wb+') as destination:
+        for chunk in file.chunks():
+            digest.update(chunk)
+            destination.write(chunk)
+    sha256 = digest.hexdigest()
+    if sha256 == known_sha256 and os.path.exists(final_path):
+        os.unlink(tmp_path)
+        return name, sha256, False
+    os.replace(tmp_path, final_path)
+    return name, sha256, True
+
+def remove_session_document(session_id, name, manifest):
+    """Deletes a document's PDF, its parsed document and its manifest/ingest entries."""
+    doc = manifest["documents"].pop(name, None)
+    if not doc:
+        return False
+    # Forgotten first: an ingest job still parsing the document can no longer put its output in place
+    forget_document_state(session_id, name)
+    pdf_path = os.path.join(get_session_folder(session_id, doc["category"]), name)
+    if os.path.exists(pdf_path):
+        os.unlink(pdf_path)
+    parsed_path = get_parsed_document_path(session_id, name)
+    if os.path.exists(parsed_path):
+        os.unlink(parsed_path)
+    invalidate_document_index(get_temp_files_folder(session_id))
+    return True
+
 def cleanup_sessions():
     while True:
         try:
@@ -154,6 +372,7 @@ def cleanup_sessions():
                 if now - last_accessed > SESSION_TIMEOUT_SECONDS:
                     try:
                         shutil.rmtree(session_dir)
+                        job_store.forget(session_id)
                         print("info - " + f"Session {session_id} expired and removed.")
                     except Exception as e:
                         print("error - " + f"Failed to remove session {session_id}: {e}")
@@ -222,16 +441,11 @@ def uploadPdf(request):
     # 1. Clear old data from session folder only
     clear_folder(current_folder)
     clear_folder(past_folder)
+    invalidate_document_index(temp_files_folder)
     os.makedirs(current_folder, exist_ok=True)
     os.makedirs(past_folder, exist_ok=True)
     os.makedirs(temp_files_folder, exist_ok=True)
 
-    # CLEAR OLD PROCESSING RESULTS for this session when new PDFs are uploaded - THREAD SAFE
-    with processing_data_lock:
-        if session_id in session_processing_results:
-            del session_processing_results[session_id]
-            print(f"info - Cleared old processing results for session {session_id}")
-
     # 2. Get uploaded files and form data
     current_files = request.FILES.getlist('files_current')
     past_files = request.FILES.getlist('files_past')
@@ -239,99 +453,453 @@ def uploadPdf(request):
     if not current_files:
         return Response({"error": "No current PDF was uploaded."}, status=status.HTTP_400_BAD_REQUEST)
 
-    # 3. Save files to the session-specific filesystem (not DB)
-    for file in current_files:
-        file.name = normalize_name(file.name)
-        with open(os.path.join(current_folder, file.name), 'wb+') as destination:
-            for chunk in file.chunks():
-                destination.write(chunk)
-
-    for file in past_files:
-        file.name = normalize_name(file.name)
-        with open(os.path.join(past_folder, file.name), 'wb+') as destination:
-            for chunk in file.chunks():
-                destination.write(chunk)
+    # 3. Save files to the session-specific filesystem (not DB) and record them in the manifest
+    manifest = {"documents": {}}
+    for category, folder, files in (("current", current_folder, current_files), ("past", past_folder, past_files)):
+        for file in files:
+            name, sha256, _ = save_uploaded_pdf(file, folder)
+            manifest["documents"][name] = {"category": category, "sha256": sha256}
+    with session_file_lock(session_id, "manifest"):
+        write_manifest(session_id, manifest)
 
     print("File Upload Successful")
 
-    # Create JSON files for PDFs in both current and past folders
-    for folder in [current_folder, past_folder]:
-        pdf_files = [f for f in os.listdir(folder) if f.lower().endswith('.pdf')]
-        for item in pdf_files:
-            full_item_path = os.path.join(folder, item)
-            create_output_json(full_item_path, temp_files_folder)
-
-    # Start background thread to process insights for this session
-    def start_processing_thread():
-        # ALWAYS START NEW THREAD - THREAD SAFE
-        with processing_data_lock:
-            if session_id in session_processing_threads and session_processing_threads[session_id].is_alive():
-                print(f"info - Stopping existing processing thread for session {session_id}")
-        
-        lock = threading.Lock()
-        with processing_data_lock:
-            session_processing_locks[session_id] = lock
-        lock.acquire()
-        
-        t = threading.Thread(target=process_pdf_for_session, args=(session_id,), daemon=True)
-        with processing_data_lock:
-            session_processing_threads[session_id] = t
-        t.start()
-        print(f"info - Started new processing thread for session {session_id}")
-        
-    start_processing_thread()
+    # 4. Parse in the background; the response only carries the job id
+    current_paths = [os.path.join(current_folder, f) for f in os.listdir(current_folder) if f.lower().endswith('.pdf')]
+    past_paths = [os.path.join(past_folder, f) for f in os.listdir(past_folder) if f.lower().endswith('.pdf')]
+    job_id = start_ingest_job(session_id, current_paths, past_paths, replace_all=True)
 
     return Response({
-        "message": "Files Stored Successfully. Processing started in background."
+        "message": "Files Stored Successfully. Processing started in background.",
+        "job_id": job_id,
+        "documents": [os.path.basename(path) for path in current_paths + past_paths]
+    }, status=status.HTTP_202_ACCEPTED)
+
+def reset_session_insights(session_id):
+    """
+    Drops the current document's insights and queues a new insights job (superseding any running one),
+    so insights requests on every worker wait for the next run. Returns the new job's id.
+    """
+    return job_store.reset(session_id)
+
+def start_ingest_job(session_id, current_paths, past_paths, replace_all=False):
+    """Queues the documents, starts the background ingest thread and returns its job id."""
+    job_id = uuid.uuid4().hex
+    queue_documents(session_id, job_id, [os.path.basename(path) for path in current_paths + past_paths], replace_all)
+    # Insights requests wait on the pending job from now on, not only once the insights thread starts
+    insights_job_id = reset_session_insights(session_id) if current_paths else None
+
+    t = threading.Thread(
+        target=ingest_session_documents, args=(session_id, job_id, current_paths, past_paths, insights_job_id), daemon=True
+    )
+    t.start()
+    return job_id
+
+def ingest_session_documents(session_id, job_id, current_paths, past_paths, insights_job_id=None):
+    """
+    Background ingest pipeline: parses the current PDF first so the insights thread can start,
+    then the past PDFs. find_relevant_sections works against each document as soon as it is ready.
+    """
+    temp_files_folder = get_temp_files_folder(session_id)
+    # Parse into a folder of our own and move each output into temp_files only while this job
+    # still owns the document: a newer upload or a removal must not get stale outlines back
+    staging_folder = os.path.join(temp_files_folder, f".ingest-{job_id}")
+    os.makedirs(staging_folder, exist_ok=True)
+
+    def place_output(pdf_path):
+        staged_path = parsed_document_path(staging_folder, pdf_path)
+        os.replace(staged_path, parsed_document_path(temp_files_folder, pdf_path))
+        if staged_path.with_suffix(".json").exists():  # INTERMEDIATE_JSON_EXPORT debug copy
+            os.replace(staged_path.with_suffix(".json"), parsed_document_path(temp_files_folder, pdf_path).with_suffix(".json"))
+
+    def on_state(pdf_path, state, error=None):
+        document = os.path.basename(pdf_path)
+        place = (lambda: place_output(pdf_path)) if state == "ready" else None
+        if not set_document_state(session_id, job_id, document, state, error, place=place):
+            if state == "ready":
+                print(f"info - Dropping {document} parsed by superseded ingest job {job_id}")
+
+    def owned(paths):
+        return [path for path in paths if owns_document(session_id, job_id, os.path.basename(path))]
+
+    current_paths = owned(current_paths)
+    if current_paths:
+        try:
+            current_failures = parse_documents(current_paths, staging_folder, cache=parse_cache, on_state=on_state)
+        except Exception as e:
+            current_failures = {path: str(e) for path in current_paths}
+            for path in current_paths:
+                on_state(path, "failed", str(e))
+
+        if current_failures:
+            # Nothing to build insights from: fail the insights job, which ends the wait of anyone waiting on it
+            store_session_result(session_id, insights_job_id, "failed", {
+                "error": "Failed to parse the current PDF: " + "; ".join(current_failures.values())
+            })
+        else:
+            start_processing_thread(session_id, insights_job_id)
+    elif insights_job_id:
+        # The current PDF was removed or re-uploaded meanwhile; a newer job owns the insights if any
+        store_session_result(session_id, insights_job_id, "failed", {"error": "The current PDF was removed or replaced."})
+
+    try:
+        past_paths = owned(past_paths)
+        parse_documents(past_paths, staging_folder, cache=parse_cache, on_state=on_state)
+    except Exception as e:
+        for path in past_paths:
+            on_state(path, "failed", str(e))
+    finally:
+        shutil.rmtree(staging_folder, ignore_errors=True)
+
+    if (read_ingest_status(session_id) or {}).get("job_id") != job_id:
+        print(f"info - Ingest job {job_id} for session {session_id} was superseded; skipping the index build")
+        return
+
+    # Build the heading index now so the first find_relevant_sections request doesn't pay for it
+    try:
+        index = get_document_index(temp_files_folder, get_session_folder(session_id, "past"), get_session_folder(session_id, "current"))
+        index.bm25()
+        index.vectors()
+    except Exception as e:
+        print(f"error - Failed to build document index for session {session_id}: {e}")
+    print(f"info - Ingest job {job_id} finished for session {session_id}")
+
+def start_processing_thread(session_id, job_id):
+    """
+    Claims the session's pending insights + podcast job and queues it on the processing executor;
+    it finishes the job when done. Older jobs of the session stop at their next checkpoint.
+    """
+    if job_store.claim(session_id, job_id) is None:
+        print(f"info - Insights job {job_id} for session {session_id} was superseded or is already running")
+        return
+
+    processing_executor.submit(process_pdf_for_session, session_id, job_id)
+    print(f"info - Queued insights job {job_id} for session {session_id}")
+
+@api_view(['GET'])
+def ingest_status(request):
+    try:
+        session_id = get_session_id(request)
+    except Exception as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    update_last_accessed(session_id)
+
+    ingest_status = read_ingest_status(session_id)
+    job_id = request.query_params.get("job_id")
+    if not ingest_status or (job_id and ingest_status.get("job_id") != job_id):
+        return Response({"error": "No ingest job found for this session."}, status=status.HTTP_404_NOT_FOUND)
+
+    states = [doc["state"] for doc in ingest_status["documents"].values()]
+    ingest_status["ready"] = states.count("ready")
+    ingest_status["failed"] = states.count("failed")
+    ingest_status["total"] = len(states)
+    ingest_status["done"] = all(state in ("ready", "failed") for state in states)
+    return Response(ingest_status, status=status.HTTP_200_OK)
+
+def relevant_sections_cache_key(session_id, user_text, mode):
+    """
+    Cache key for a find_relevant_sections response: the selection (whitespace-normalised), the
+    relevance mode and the session's manifest hash, so any document change invalidates it.
+    Responses hold session file paths, hence the session id.
+    """
+    selection = " ".join(user_text.split())
+    scope = {"session": session_id, "manifest": get_manifest_hash(session_id), "mode": mode or RELEVANCE_MODE}
+    return llm_cache.key("find_relevant_sections", scope, selection)
+
+@api_view(['GET'])
+def cache_stats(request):
+    """Hit rates of the shared caches (each counts lookups from every worker process)."""
+    return Response({
+        "parse_cache": parse_cache.stats(),
+        "llm_cache": llm_cache.stats(),
+        "podcast_script_cache": podcast_script_cache.stats(),
+        "podcast_audio_cache": podcast_audio_cache.stats(),
     }, status=status.HTTP_200_OK)
 
-#Send Pdf and Text Logic
-@api_view(['POST'])
-@parser_classes([MultiPartParser, FormParser])
-def Get_Relevant_Topics(request):
+@api_view(['GET', 'POST', 'DELETE'])
+@parser_classes([MultiPartParser, FormParser, JSONParser])
+def session_documents(request):
+    """
+    Incremental document management for a session.
+    GET lists the manifest; POST adds or replaces documents ('files_current' replaces the current PDF,
+    'files_past' adds/replaces past PDFs) and only parses what changed; DELETE removes the
+    documents named in 'documents'. Parsed output of untouched documents is kept.
+    """
     try:
         session_id = get_session_id(request)
     except Exception as e:
         return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     update_last_accessed(session_id)
 
-    files_past_path = get_session_folder(session_id, "past")
-    files_current_path = get_session_folder(session_id, "current")
-    json_folder = get_temp_files_folder(session_id)
+    current_folder = get_session_folder(session_id, "current")
+    past_folder = get_session_folder(session_id, "past")
+    for folder in (current_folder, past_folder, get_temp_files_folder(session_id)):
+        os.makedirs(folder, exist_ok=True)
+
+    if request.method == 'GET':
+        manifest = read_manifest(session_id)
+        return Response({**manifest, "manifest_hash": get_manifest_hash(session_id)}, status=status.HTTP_200_OK)
+
+    if request.method == 'DELETE':
+        # JSON body {"documents": [...]}, a form body, or ?documents=a.pdf&documents=b.pdf
+        if hasattr(request.data, 'getlist'):
+            names = request.data.getlist('documents')
+        else:
+            names = request.data.get('documents')
+            if isinstance(names, str):
+                names = [names]
+            elif not isinstance(names, list):
+                names = []
+        names = names or request.query_params.getlist('documents')
+        names = [normalize_name(name) for name in names]
+        if not names:
+            return Response({"error": "Name the documents to remove in 'documents'."}, status=status.HTTP_400_BAD_REQUEST)
+        with session_file_lock(session_id, "manifest"):
+            manifest = read_manifest(session_id)
+            removed_current = any(manifest["documents"].get(name, {}).get("category") == "current" for name in names)
+            removed = [name for name in names if remove_session_document(session_id, name, manifest)]
+            write_manifest(session_id, manifest)
+        if removed_current:
+            job_store.reset(session_id, {"error": "No PDF file found in session current folder."}, state="failed")
+        return Response({
+            "removed": removed,
+            "not_found": [name for name in names if name not in removed],
+            "manifest_hash": get_manifest_hash(session_id)
+        }, status=status.HTTP_200_OK)
+
+    current_files = request.FILES.getlist('files_current')
+    past_files = request.FILES.getlist('files_past')
+    if not current_files and not past_files:
+        return Response({"error": "No PDF was uploaded."}, status=status.HTTP_400_BAD_REQUEST)
+    if len(current_files) > 1:
+        return Response({"error": "Only one current PDF can be uploaded."}, status=status.HTTP_400_BAD_REQUEST)
+
+    changes, current_paths, past_paths = {}, [], []
+    with session_file_lock(session_id, "manifest"):
+        manifest = read_manifest(session_id)
+        for category, folder, files, changed_paths in (("current", current_folder, current_files, current_paths),
+                                                      ("past", past_folder, past_files, past_paths)):
+            for file in files:
+                name = normalize_name(file.name)
+                known = manifest["documents"].get(name)
+                if known and known["category"] != category:
+                    remove_session_document(session_id, name, manifest)
+                    known = None
+                name, sha256, changed = save_uploaded_pdf(file, folder, known["sha256"] if known else None)
+                if not changed:
+                    changes[name] = "unchanged"
+                    continue
+                if category == "current":
+                    # The session has a single current document: drop the previous one
+                    for old_name, doc in list(manifest["documents"].items()):
+                        if doc["category"] == "current" and old_name != name:
+                            remove_session_document(session_id, old_name, manifest)
+                if known:
+                    # Stale outline must not be served for the new bytes while they are parsed, nor be
+                    # put back by an ingest job still parsing the old bytes
+                    forget_document_state(session_id, name)
+                    parsed_path = get_parsed_document_path(session_id, name)
+                    if os.path.exists(parsed_path):
+                        os.unlink(parsed_path)
+                changes[name] = "replaced" if known else "added"
+                manifest["documents"][name] = {"category": category, "sha256": sha256}
+                changed_paths.append(os.path.join(folder, name))
+        write_manifest(session_id, manifest)
+
+    if not current_paths and not past_paths:
+        return Response({
+            "message": "All documents are unchanged.",
+            "documents": changes,
+            "manifest_hash": get_manifest_hash(session_id)
+        }, status=status.HTTP_200_OK)
+
+    job_id = start_ingest_job(session_id, current_paths, past_paths)
+    return Response({
+        "message": "Changed documents are being processed in background.",
+        "job_id": job_id,
+        "documents": changes,
+        "manifest_hash": get_manifest_hash(session_id)
+    }, status=status.HTTP_202_ACCEPTED)
+
+def read_relevant_sections_request(request):
+    """
+    Validates a find_relevant_sections request.
+    Returns (session_id, user_text, mode, None), or (None, None, None, error Response).
+    """
+    try:
+        session_id = get_session_id(request)
+    except Exception as e:
+        return None, None, None, Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    update_last_accessed(session_id)
 
     user_text = request.data.get("selected_text")
     print(user_text)
 
     if not user_text:
-        return Response({
+        return None, None, None, Response({
             "error": "The 'selected_text' field is required and cannot be empty."
         }, status=status.HTTP_400_BAD_REQUEST)
 
+    # Optional: "llm" (per-document Gemini filter), "bm25" (local pre-filter) or "vector" (no LLM at all)
+    mode = request.data.get("mode") or None
+    if mode and mode not in RELEVANCE_MODES:
+        return None, None, None, Response({
+            "error": f"'mode' must be one of: {', '.join(RELEVANCE_MODES)}."
+        }, status=status.HTTP_400_BAD_REQUEST)
+    return session_id, user_text, mode, None
+
+def finish_relevant_sections(session_id, cache_key, result_data):
+    """Completes a find_relevant_sections result with the pending documents and caches it when final."""
+    # Results only cover the documents parsed so far; tell the client how many are still pending
+    ingest_status = read_ingest_status(session_id) or {"documents": {}}
+    pending_documents = [name for name, doc in ingest_status["documents"].items() if doc["state"] in ("queued", "parsing")]
+
+    # Only complete answers are reused: while documents are still parsing the result can still change,
+    # and an empty result or a failed summary is worth another try
+    cacheable = not pending_documents and is_complete_result(result_data)
+    if result_data and result_data.get("extracted_sections"):
+        result_data["pending_documents"] = pending_documents
+    else:
+        result_data = {
+            "message": "Analysis completed, but no relevant sections were found.",
+            "extracted_sections": [],
+            "pending_documents": pending_documents
+        }
+
+    if cacheable:
+        llm_cache.put(cache_key, "find_relevant_sections", json.dumps(result_data, ensure_ascii=False))
+    return result_data
+
+#Send Pdf and Text Logic
+@api_view(['POST'])
+@parser_classes([MultiPartParser, FormParser])
+def Get_Relevant_Topics(request):
+    session_id, user_text, mode, error_response = read_relevant_sections_request(request)
+    if error_response:
+        return error_response
+
+    files_past_path = get_session_folder(session_id, "past")
+    files_current_path = get_session_folder(session_id, "current")
+    json_folder = get_temp_files_folder(session_id)
+
     try:
         os.makedirs(json_folder, exist_ok=True)
         os.makedirs(files_current_path, exist_ok=True)
 
+        # Same selection over the same documents: answer from the response cache
+        cache_key = relevant_sections_cache_key(session_id, user_text, mode)
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            print(f"info - Served relevant sections from cache for session {session_id}")
+            return Response(json.loads(cached), status=status.HTTP_200_OK)
+
         result_data = main_functionality(
             json_folder=json_folder,
             text=user_text,
             input_dir=files_past_path,
-            curr_dir=files_current_path
+            curr_dir=files_current_path,
+            mode=mode
         )
-
-        if result_data and result_data.get("extracted_sections"):
-            return Response(result_data, status=status.HTTP_200_OK)
-        else:
-            return Response({
-                "message": "Analysis completed, but no relevant sections were found.",
-                "extracted_sections": []
-            }, status=status.HTTP_200_OK)
+        return Response(finish_relevant_sections(session_id, cache_key, result_data), status=status.HTTP_200_OK)
 
     except Exception as e:
-        print("error - " + f"An unexpected error occurred in Get_Relevant_Topics view: {e}", exc_info=True)
+        logging.exception(f"An unexpected error occurred in Get_Relevant_Topics view: {e}")
         return Response({
             "error": "An unexpected error occurred on the server during document analysis."
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+def sse_event(event, data):
+    """One Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def sse_response(events):
+    response = StreamingHttpResponse(events, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # nginx would otherwise buffer the whole stream before passing it on
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+@api_view(['POST'])
+@parser_classes([MultiPartParser, FormParser])
+def Get_Relevant_Topics_Stream(request):
+    """
+    Streaming find_relevant_sections (Server-Sent Events). Events: "keywords", "candidates",
+    "sections" (ranked sections with document, page_number and location, before any summary),
+    "summary" ({section_title, importance_rank, refined_text}) as each summary arrives, then
+    "done" with the same body find_relevant_sections returns, or "error".
+    """
+    session_id, user_text, mode, error_response = read_relevant_sections_request(request)
+    if error_response:
+        return error_response
+
+    files_past_path = get_session_folder(session_id, "past")
+    files_current_path = get_session_folder(session_id, "current")
+    json_folder = get_temp_files_folder(session_id)
+    os.makedirs(json_folder, exist_ok=True)
+    os.makedirs(files_current_path, exist_ok=True)
+
+    def events():
+        try:
+            cache_key = relevant_sections_cache_key(session_id, user_text, mode)
+            cached = llm_cache.get(cache_key)
+            if cached is not None:
+                print(f"info - Served relevant sections from cache for session {session_id}")
+                result_data = json.loads(cached)
+                yield sse_event("sections", {"extracted_sections": result_data["extracted_sections"]})
+                yield sse_event("done", result_data)
+                return
+
+            for event, data in stream_relevant_sections(json_folder, user_text, files_past_path, files_current_path, mode=mode):
+                if event == "done":
+                    data = finish_relevant_sections(session_id, cache_key, data)
+                yield sse_event(event, data)
+        except Exception as e:
+            print("error - " + f"An unexpected error occurred in Get_Relevant_Topics_Stream view: {e}")
+            yield sse_event("error", {"error": "An unexpected error occurred on the server during document analysis."})
+
+    return sse_response(events())
+
+def read_wait_seconds(request):
+    """The ?wait= long-poll time, capped at LONG_POLL_MAX_SECONDS (0 answers right away)."""
+    try:
+        wait = float(request.GET.get("wait", 0))
+    except ValueError:
+        wait = 0.0
+    return max(0.0, min(wait, LONG_POLL_MAX_SECONDS))
+
+def has_insights(job):
+    return bool(job) and "results" in job["result"]
+
+def has_podcast(job):
+    podcast_path = job["result"].get("podcast") if job else None
+    return bool(podcast_path) and os.path.exists(podcast_path)
+
+def job_progress(session_id, job):
+    """What a 202 response reports about the session's job in flight."""
+    result = job["result"] if job else {}
+    if not job or job["state"] == "pending":
+        stage = "parsing"
+    elif "results" not in result:
+        stage = "insights"
+    else:
+        stage = "podcast"
+    ingest = read_ingest_status(session_id) or {"documents": {}}
+    return {
+        "status": "processing",
+        "stage": stage,
+        "job_id": job["job_id"] if job else None,
+        "elapsed_seconds": int(time.time() - job["created"]) if job else 0,
+        "categories_done": sorted(result.get("partial_results", {})),
+        "documents": {name: doc["state"] for name, doc in ingest["documents"].items()},
+    }
+
+def accepted_response(session_id, job):
+    return Response(
+        job_progress(session_id, job),
+        status=status.HTTP_202_ACCEPTED,
+        headers={"Retry-After": str(POLL_RETRY_AFTER_SECONDS)},
+    )
+
 # Generate insights
 @api_view(['GET'])
 @parser_classes([MultiPartParser, FormParser])
@@ -342,37 +910,238 @@ def generate_insights(request):
         return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
     update_last_accessed(session_id)
 
-    # If already processed, return result - THREAD SAFE
-    with processing_data_lock:
-        if session_id in session_processing_results:
-            result = session_processing_results[session_id]
-            if "results" in result:
-                return Response(result["results"], status=status.HTTP_201_CREATED)
-            else:
-                return Response(result, status=status.HTTP_400_BAD_REQUEST)
-
-    # If processing thread is running, wait for it - THREAD SAFE
-    with processing_data_lock:
-        lock = session_processing_locks.get(session_id)
-    if lock:
-        lock.acquire()
-        lock.release()
-        # After thread finishes, return result - THREAD SAFE
-        with processing_data_lock:
-            result = session_processing_results.get(session_id)
-        if result and "results" in result:
+    wait = read_wait_seconds(request)
+
+    # If already processed, return result
+    # (an entry holding only "partial_results" is a streaming request still in progress)
+    job = job_store.get(session_id)
+    result = job["result"] if job else None
+    if result:
+        if "results" in result:
             return Response(result["results"], status=status.HTTP_201_CREATED)
-        else:
-            return Response(result or {"error": "Processing failed."}, status=status.HTTP_400_BAD_REQUEST)
+        elif "partial_results" not in result and not job_store.is_active(job):
+            return Response(result, status=status.HTTP_400_BAD_REQUEST)
+
+    # If not started (or its worker died), queue it - unless another worker claims it first
+    if not job_store.is_active(job):
+        job_id = job_store.claim(session_id)
+        if job_id is not None:
+            processing_executor.submit(process_pdf_for_session, session_id, job_id)
 
-    # If not started, start processing synchronously
-    process_pdf_for_session(session_id)
-    with processing_data_lock:
-        result = session_processing_results.get(session_id)
+    # Wait (at most ?wait= seconds) for the insights, in whichever worker computes them
+    job = job_store.wait(session_id, timeout=wait, until=has_insights)
+    result = job["result"] if job else None
     if result and "results" in result:
         return Response(result["results"], status=status.HTTP_201_CREATED)
+    if job_store.is_active(job) or job_store.abandoned(job):
+        return accepted_response(session_id, job)
+    return Response(result or {"error": "Processing failed."}, status=status.HTTP_400_BAD_REQUEST)
+
+def commit_insight_category(session_id, job_id, category, items):
+    """Stores one finished insight category as soon as it is complete (dropped once job_id is superseded)"""
+    def mutate(entry):
+        if "error" in entry:
+            entry.clear()
+        if "results" not in entry:
+            entry.setdefault("partial_results", {})[category] = items
+    job_store.update(session_id, mutate, job_id=job_id)
+
+def follow_insights_job(session_id, job_id):
+    """
+    SSE events for a running insights job: "category" for each category as the job stores it
+    (all at once for a single structured request), then "done", or "error" if the job fails or is
+    superseded. The stream holds a worker for at most LONG_POLL_MAX_SECONDS: after that it ends with
+    "retry" ({retry_after}) and the client requests the stream again, which replays the landed categories.
+    """
+    sent = set()
+    deadline = time.monotonic() + LONG_POLL_MAX_SECONDS
+
+    def landed(job):
+        result = job["result"] if job else {}
+        return result.get("results") or result.get("partial_results") or {}
+
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            yield sse_event("retry", {"retry_after": POLL_RETRY_AFTER_SECONDS})
+            return
+        job = job_store.wait(
+            session_id, timeout=remaining,
+            until=lambda job: has_insights(job) or bool(set(landed(job)) - sent) or job["job_id"] != job_id,
+        )
+        if not job or job["job_id"] != job_id:
+            yield sse_event("error", {"error": "The session's documents changed; request the insights again."})
+            return
+        for category, items in landed(job).items():
+            if category in INSIGHT_CATEGORIES and category not in sent:
+                sent.add(category)
+                yield sse_event("category", {"category": category, "items": items})
+        if has_insights(job):
+            yield sse_event("done", {"results": job["result"]["results"]})
+            return
+        if not job_store.is_active(job):
+            yield sse_event("error", {"error": job["result"].get("error", "Processing failed.")})
+            return
+        yield ": waiting for the insights job\n\n"
+
+@api_view(['GET'])
+def generate_insights_stream(request):
+    """
+    Streaming get_insights (Server-Sent Events). Events: "delta" ({category, text}) as the model writes,
+    "category" ({category, items}) as each category completes (also stored for the session right away),
+    "category_error", then "done" ({results}), or "error". While the upload's insights job is running,
+    its categories are sent as the job stores them instead (no "delta" events), and the stream may end
+    with "retry" ({retry_after}): request it again after that many seconds.
+    """
+    try:
+        session_id = get_session_id(request)
+    except Exception as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    update_last_accessed(session_id)
+
+    past_folder = get_session_folder(session_id, "past")
+    current_folder = get_session_folder(session_id, "current")
+    file_name = None
+    if os.path.exists(current_folder):
+        for f in os.listdir(current_folder):
+            if f.lower().endswith('.pdf'):
+                file_name = f
+                break
+    if not file_name:
+        return Response({"error": "No PDF file found in session current folder."}, status=status.HTTP_400_BAD_REQUEST)
+
+    job = job_store.get(session_id)
+    results = dict(job["result"]["results"]) if has_insights(job) else None
+    # The upload's insights job is running (in any worker): follow it rather than start a second run
+    following = results is None and job_store.is_active(job)
+
+    def events():
+        # Already computed: replay the finished categories
+        if results is not None:
+            for category, items in results.items():
+                if category in INSIGHT_CATEGORIES:
+                    yield sse_event("category", {"category": category, "items": items})
+            yield sse_event("done", {"results": results})
+            return
+        if following:
+            yield from follow_insights_job(session_id, job["job_id"])
+            return
+        # Every write carries the job id seen at the start, so a stream outliving a re-upload stores nothing
+        job_id = job["job_id"] if job else job_store.current_job_id(session_id)
+        try:
+            for event, data in stream_insights(past_folder, file_name):
+                if event == "category":
+                    commit_insight_category(session_id, job_id, data["category"], data["items"])
+                elif event == "done" and all(items is not None for items in data["results"].values()):
+                    text = extract_text_from_document(past_folder, file_name)
+
+                    def mutate(entry):
+                        if "results" not in entry:
+                            entry.pop("partial_results", None)
+                            entry.update({"results": data["results"], "file_name": file_name})
+                    job_store.update(session_id, mutate, job_id=job_id, text=text)
+                yield sse_event(event, data)
+        except Exception as e:
+            print(f"error - Streaming insights failed for session {session_id}: {e}")
+            yield sse_event("error", {"error": str(e)})
+
+    return sse_response(events())
+
+@functools.lru_cache(maxsize=256)
+def _audio_sha256(path, inode, mtime_ns, size):
+    return sha256_file(path)
+
+def audio_etag(path):
+    """Strong ETag from the audio's content hash (recomputed only when the file changes)."""
+    st = os.stat(path)
+    return f'"{_audio_sha256(path, st.st_ino, st.st_mtime_ns, st.st_size)}"'
+
+def etag_matches(header, etag):
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+def parse_byte_range(header, size):
+    """
+    (first, last) byte positions for a single "bytes=" range; None if the header should be ignored
+    (malformed, or several ranges: the whole file is sent), False if it cannot be satisfied.
+    """
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if not first:
+        suffix_length = int(last)
+        if suffix_length == 0 or size == 0:
+            return False
+        return max(0, size - suffix_length), size - 1
+    first = int(first)
+    last = int(last) if last else size - 1
+    if last < first and first < size:
+        return None
+    if first >= size:
+        return False
+    return first, min(last, size - 1)
+
+def iter_file_range(path, first, length):
+    with open(path, 'rb') as f:
+        f.seek(first)
+        while length > 0:
+            chunk = f.read(min(AUDIO_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+def serve_audio_file(request, path, content_type='audio/mpeg', download_filename=None):
+    """
+    Serves an audio file with byte-range support (so the audio element can seek) and ETag/If-None-Match
+    revalidation. With PODCAST_ACCEL_REDIRECT_PREFIX set, the transfer itself is handed to nginx.
+    """
+    etag = audio_etag(path)
+    if etag_matches(request.META.get("HTTP_IF_NONE_MATCH"), etag):
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        response["ETag"] = etag
+        return response
+
+    media_root = os.path.realpath(settings.MEDIA_ROOT)
+    real_path = os.path.realpath(path)
+    if PODCAST_ACCEL_REDIRECT_PREFIX and real_path.startswith(media_root + os.sep):
+        # nginx serves ranges for internal locations itself
+        response = HttpResponse(content_type=content_type)
+        relative_path = os.path.relpath(real_path, media_root).replace(os.sep, "/")
+        response["X-Accel-Redirect"] = PODCAST_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + quote(relative_path)
     else:
-        return Response(result or {"error": "Processing failed."}, status=status.HTTP_400_BAD_REQUEST)
+        size = os.path.getsize(path)
+        byte_range = None
+        range_header = request.META.get("HTTP_RANGE")
+        if_range = request.META.get("HTTP_IF_RANGE")
+        if range_header and (not if_range or if_range.strip() == etag):
+            byte_range = parse_byte_range(range_header, size)
+        if byte_range is False:
+            response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+        if byte_range:
+            first, last = byte_range
+            response = StreamingHttpResponse(
+                iter_file_range(path, first, last - first + 1),
+                status=status.HTTP_206_PARTIAL_CONTENT,
+                content_type=content_type,
+            )
+            response["Content-Range"] = f"bytes {first}-{last}/{size}"
+            response["Content-Length"] = str(last - first + 1)
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+
+    response["ETag"] = etag
+    response["Accept-Ranges"] = "bytes"
+    # A session's podcast changes when its document does, so browsers revalidate instead of reusing blindly
+    response["Cache-Control"] = "private, no-cache"
+    if download_filename:
+        response["Content-Disposition"] = f'attachment; filename="{download_filename}"'
+    return response
 
 @api_view(['GET'])
 def podcast(request):
@@ -394,67 +1163,47 @@ def podcast(request):
     if not file_name:
         return Response({"error": "No PDF file found in session current folder."}, status=status.HTTP_400_BAD_REQUEST)
 
-    past_folder = get_session_folder(session_id, "past")
-    audio_dir = os.path.join(past_folder, "audio_files")
-    os.makedirs(audio_dir, exist_ok=True)
-    audio_loc = os.path.join(audio_dir, file_name.replace('.pdf', '.mp3'))
-
-    # Wait for insight thread to finish if it is running - THREAD SAFE
-    with processing_data_lock:
-        lock = session_processing_locks.get(session_id)
-    if lock:
-        print(f"info - Waiting for background processing to complete for session {session_id}")
-        lock.acquire()
-        lock.release()
-        print(f"info - Background processing completed for session {session_id}")
-
-    with processing_data_lock:
-        result = session_processing_results.get(session_id)
-
-    # Case 1: Podcast already generated
-    if result and "podcast" in result and result["podcast"] and os.path.exists(result["podcast"]):
-        print(f"info - Returning pre-generated podcast for session {session_id}")
-        audio_file_path = result["podcast"]
-        
-    # Case 2: Insights ready; podcast not generated
-    elif result and "results" in result and "text" in result:
-        try:
-            print(f"info - Generating podcast on-demand for session {session_id}")
-            create_audio(f"{result['text']} \n {result['results']}", audio_loc)
-            with processing_data_lock:
-                session_processing_results[session_id]["podcast"] = audio_loc
-            audio_file_path = audio_loc
-        except Exception as e:
-            print(f"error - Failed to generate podcast for session {session_id}: {e}")
-            return Response({
-                "error": f"Failed to generate audio: {str(e)}"
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    wait = read_wait_seconds(request)
 
-    # Case 3: Processing failed
-    elif result and "error" in result:
-        return Response(result, status=status.HTTP_400_BAD_REQUEST)
+    # Start whatever is missing, unless a job (in any worker) is already on it
+    job = job_store.get(session_id)
+    result = job["result"] if job else {}
+    if not job_store.is_active(job) and not has_podcast(job):
+        # Case 1: Processing failed
+        if "error" in result and "results" not in result:
+            return Response(result, status=status.HTTP_400_BAD_REQUEST)
+        # Case 2: Insights ready; podcast not generated (or failed too recently to retry)
+        elif "results" in result:
+            failed_at = result.get("podcast_failed_at") or 0
+            if result.get("podcast_error") and time.time() - failed_at < PODCAST_RETRY_AFTER_FAILURE_SECONDS:
+                return Response({
+                    "error": f"Failed to generate audio: {result['podcast_error']}"
+                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            job_id = job_store.claim(session_id, reopen=True)
+            if job_id is not None:
+                print(f"info - Generating podcast on-demand for session {session_id}")
+                processing_executor.submit(generate_session_podcast, session_id, job_id)
+        # Case 3: No processing yet (or its worker died)
+        else:
+            job_id = job_store.claim(session_id)
+            if job_id is not None:
+                print(f"info - No background processing found, queueing it for session {session_id}")
+                processing_executor.submit(process_pdf_for_session, session_id, job_id)
 
-    # Case 4: No processing yet - do everything now
-    else:
-        try:
-            print(f"info - No background processing found, processing manually for session {session_id}")
-            results, text = process_document(past_folder, file_name)
-            if not results:
-                return Response({"error": "Invalid Document or file name"}, status=status.HTTP_400_BAD_REQUEST)
-            create_audio(f"{text} \n {results}", audio_loc)
-            with processing_data_lock:
-                session_processing_results[session_id] = {
-                    "results": results,
-                    "text": text,
-                    "podcast": audio_loc,
-                    "file_name": file_name
-                }
-            audio_file_path = audio_loc
-        except Exception as e:
-            print(f"error - Manual podcast generation failed for session {session_id}: {e}")
-            return Response({
-                "error": f"Failed to process document or generate audio: {str(e)}"
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    # Wait (at most ?wait= seconds) for the podcast, in whichever worker generates it
+    job = job_store.wait(session_id, timeout=wait, until=has_podcast)
+    result = job["result"] if job else {}
+    if not has_podcast(job):
+        if job_store.is_active(job) or job_store.abandoned(job):
+            return accepted_response(session_id, job)
+        if "error" in result and "results" not in result:
+            return Response(result, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            "error": f"Failed to generate audio: {result.get('podcast_error', 'Podcast was not generated')}"
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    print(f"info - Returning pre-generated podcast for session {session_id}")
+    audio_file_path = result["podcast"]
 
     # Return the actual audio file
     try:
@@ -467,14 +1216,8 @@ def podcast(request):
             # Create filename for download
             download_filename = f"podcast_{file_name.replace('.pdf', '.mp3')}"
             
-            # Return the file as response
-            response = FileResponse(
-                open(audio_file_path, 'rb'),
-                content_type=content_type,
-                filename=download_filename
-            )
-            response['Content-Disposition'] = f'attachment; filename="{download_filename}"'
-            return response
+            # Return the file as response (ranges, ETag, optionally sent by nginx)
+            return serve_audio_file(request, audio_file_path, content_type, download_filename)
         else:
             return Response({
                 "error": "Audio file was generated but cannot be found"
@@ -484,3 +1227,94 @@ def podcast(request):
         return Response({
             "error": f"Failed to serve audio file: {str(e)}"
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET', 'HEAD'])
+def podcast_stream(request):
+    """
+    Progressive generate_audio_podcast: MP3 audio sent over a chunked response as each group of
+    dialogue turns is synthesised, so playback starts after the first turns. The full file is
+    still written and later requests (streaming or not) are served from it.
+    While the session's job (in any worker) is still making the insights or its podcast, this waits
+    for it (at most ?wait= or LONG_POLL_MAX_SECONDS) and answers 202 rather than synthesise a second
+    copy; without insights it queues that job first, as podcast does. HEAD answers the same without
+    a body, so clients can poll until the audio is ready.
+    """
+    try:
+        session_id = get_session_id(request, allow_query=True)
+    except Exception as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    update_last_accessed(session_id)
+
+    current_folder = get_session_folder(session_id, "current")
+    file_name = None
+    if os.path.exists(current_folder):
+        for f in os.listdir(current_folder):
+            if f.lower().endswith('.pdf'):
+                file_name = f
+                break
+    if not file_name:
+        return Response({"error": "No PDF file found in session current folder."}, status=status.HTTP_400_BAD_REQUEST)
+
+    # A running job makes the insights and then the podcast: wait (bounded) for it rather than redo its work
+    job = job_store.get(session_id)
+    result = job["result"] if job else {}
+    if not job_store.is_active(job) and not has_podcast(job) and "results" not in result:
+        if "error" in result:
+            return Response(result, status=status.HTTP_400_BAD_REQUEST)
+        # No insights yet (or their worker died): queue the processing job rather than run it in this request
+        job_id = job_store.claim(session_id)
+        if job_id is not None:
+            print(f"info - No background processing found, queueing it for session {session_id}")
+            processing_executor.submit(process_pdf_for_session, session_id, job_id)
+        job = job_store.get(session_id)
+    if job_store.is_active(job) and not has_podcast(job):
+        wait = read_wait_seconds(request) if "wait" in request.GET else LONG_POLL_MAX_SECONDS
+        job = job_store.wait(session_id, timeout=wait, until=has_podcast)
+        if job_store.is_active(job) and not has_podcast(job):
+            return accepted_response(session_id, job)
+    result = job["result"] if job else {}
+    if not has_podcast(job) and "results" not in result:
+        if job_store.abandoned(job):
+            return accepted_response(session_id, job)
+        return Response({"error": result.get("error", "Processing failed.")}, status=status.HTTP_400_BAD_REQUEST)
+
+    if request.method == "HEAD":
+        # Ready: a GET now serves the finished file or starts streaming right away
+        return HttpResponse(content_type='audio/mpeg')
+
+    if has_podcast(job):
+        print(f"info - Returning pre-generated podcast for session {session_id}")
+        return serve_audio_file(request, result["podcast"])
+
+    # Every write carries the job id seen at the start, so a stream outliving a re-upload stores nothing;
+    # the per-job file name keeps it from overwriting the newer document's audio
+    job_id = job["job_id"] if job else job_store.current_job_id(session_id)
+    past_folder = get_session_folder(session_id, "past")
+    audio_dir = os.path.join(past_folder, "audio_files")
+    os.makedirs(audio_dir, exist_ok=True)
+    audio_loc = os.path.join(audio_dir, file_name.replace('.pdf', f'_{job_id[:8]}.mp3'))
+
+    try:
+        podcast_input = condense_for_prompt(past_folder, file_name, result["results"])
+        document_hash = get_document_sha256(session_id, file_name)
+    except Exception as e:
+        print(f"error - Podcast preparation failed for session {session_id}: {e}")
+        return Response({"error": f"Failed to process document: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def audio_chunks():
+        try:
+            yield from stream_audio(podcast_input, audio_loc, document_hash=document_hash)
+        except Exception as e:
+            # Headers are already sent; the client sees a truncated stream
+            print(f"error - Streaming podcast failed for session {session_id}: {e}")
+            return
+        if store_session_result(session_id, job_id, None, podcast=audio_loc):
+            print(f"info - Podcast streamed and saved for session {session_id}")
+        else:
+            os.unlink(audio_loc)
+            print(f"info - Session {session_id} changed while its podcast streamed; discarding it")
+
+    response = StreamingHttpResponse(audio_chunks(), content_type='audio/mpeg')
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,98 @@
+"""
+Tokens sent to the model before and after condensation, per document.
+
+    python benchmarks/bench_condense.py <pdf or .pdoc or dir> [...]            # default budget
+    python benchmarks/bench_condense.py --budget 4000 media/PDFsUploaded/sessions/<id>/past/temp_files
+
+"Before" is the full document text, which is what the podcast and insights prompts used to carry;
+"after" is condense_document() within the budget. Token counts use the same estimator as the
+condenser; pass --exact to also ask Gemini's count_tokens (needs credentials, one call per text).
+PDFs are parsed with the backend's parser, so they need the backend's .env like the server does.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.feature.condense import CONDENSE_TOKEN_BUDGET, condense_document, count_tokens
+from backend.feature.doc_format import DOC_SUFFIX, ParsedDocument
+
+
+def collect(paths):
+    documents = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            documents.extend(sorted(p for p in path.iterdir() if p.suffix in (".pdf", DOC_SUFFIX)))
+        else:
+            documents.append(path)
+    return documents
+
+
+def load(path, scratch):
+    """(title, outline, pages) of a .pdoc, or of a PDF parsed into scratch first."""
+    if path.suffix == ".pdf":
+        from backend.feature.base_feature import write_output_json
+        doc_path = os.path.join(scratch, path.stem + DOC_SUFFIX)
+        write_output_json(str(path), doc_path)
+    else:
+        doc_path = str(path)
+    with ParsedDocument(doc_path) as doc:
+        return doc.title, doc.outline, doc.full_text()
+
+
+def exact_counter():
+    from backend.feature.base_feature import client, model_name
+
+    def count(text):
+        return client.models.count_tokens(model=model_name, contents=text).total_tokens
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="PDFs, .pdoc files, or directories of either")
+    parser.add_argument("--budget", type=int, default=CONDENSE_TOKEN_BUDGET)
+    parser.add_argument("--exact", action="store_true", help="also report Gemini's own token counts")
+    args = parser.parse_args()
+
+    documents = collect(args.paths)
+    if not documents:
+        parser.error("no .pdf or .pdoc files found")
+    exact = exact_counter() if args.exact else None
+
+    header = f"{'document':40} {'pages':>6} {'before':>9} {'after':>8} {'saved':>7} {'ms':>7}"
+    if exact:
+        header += f" {'exact before':>13} {'exact after':>12}"
+    print(header)
+    total_before = total_after = 0
+    with tempfile.TemporaryDirectory() as scratch:
+        for path in documents:
+            try:
+                title, outline, pages = load(path, scratch)
+            except Exception as e:
+                print(f"{path.name[:40]:40} failed: {e}")
+                continue
+            full_text = "".join(pages)
+            started = time.perf_counter()
+            condensed = condense_document(title, outline, pages, budget=args.budget)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+            before, after = count_tokens(full_text), count_tokens(condensed)
+            total_before += before
+            total_after += after
+            saved = 1 - after / before if before else 0.0
+            line = f"{path.name[:40]:40} {len(pages):>6} {before:>9} {after:>8} {saved:>7.1%} {elapsed_ms:>7.1f}"
+            if exact:
+                line += f" {exact(full_text):>13} {exact(condensed):>12}"
+            print(line)
+
+    saved = 1 - total_after / total_before if total_before else 0.0
+    print(f"{'total':40} {'':>6} {total_before:>9} {total_after:>8} {saved:>7.1%}")
+
+
+if __name__ == "__main__":
+    main()
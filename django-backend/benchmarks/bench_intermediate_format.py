@@ -0,0 +1,131 @@
+"""
+Compares the old indent=2 JSON intermediate files against the .pdoc format.
+
+    python benchmarks/bench_intermediate_format.py                 # synthetic documents
+    python benchmarks/bench_intermediate_format.py --from <dir>    # real .pdoc files, e.g. a session's temp_files
+
+For each document it reports the time and the peak RSS growth of: loading the outline,
+fetching one page, and loading the full text. Every measurement runs in a fresh process so
+earlier loads do not hide the memory cost of later ones.
+"""
+import os
+import sys
+import json
+import time
+import random
+import resource
+import argparse
+import tempfile
+import multiprocessing
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backend.feature.doc_format import DOC_SUFFIX, ParsedDocument, export_json, read_outline, write_document
+
+REPEATS = 20
+WORDS = "history travel france roman city museum cuisine wine coast river castle festival market harbour".split()
+
+
+def make_synthetic(path, pages, seed):
+    rnd = random.Random(seed)
+    outline, full_text = [], []
+    for page in range(pages):
+        for section in range(3):
+            outline.append({"text": f"Section {page}.{section} {rnd.choice(WORDS).title()}", "page": page,
+                            "top_x": 72.0, "top_y": 80.0 + 200 * section, "bot_x": 300.0, "bot_y": 96.0 + 200 * section})
+        full_text.append(" ".join(rnd.choice(WORDS) for _ in range(450)))
+    write_document(path, {"title": f"Synthetic {pages} pages", "outline": outline, "full_text": full_text})
+
+
+def json_outline(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f).get('outline', [])
+
+def json_page(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        full_text = json.load(f).get('full_text', [])
+    return full_text[len(full_text) // 2]
+
+def json_full_text(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f).get('full_text', [])
+
+def pdoc_outline(path):
+    return read_outline(path)[1]
+
+def pdoc_page(path):
+    with ParsedDocument(path) as doc:
+        return doc.page(len(doc) // 2)
+
+def pdoc_full_text(path):
+    with ParsedDocument(path) as doc:
+        return doc.full_text()
+
+OPERATIONS = {
+    "outline": (json_outline, pdoc_outline),
+    "page": (json_page, pdoc_page),
+    "full_text": (json_full_text, pdoc_full_text),
+}
+
+
+def current_rss():
+    """Resident set size in bytes (/proc on Linux, peak RSS elsewhere)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _measure(func, path, queue):
+    before = current_rss()
+    keep = func(path)  # first call counts for memory; the result stays referenced like a real caller's
+    after = current_rss()
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        func(path)
+    elapsed = (time.perf_counter() - start) / REPEATS
+    queue.put((elapsed, after - before, len(keep)))
+
+
+def measure(func, path):
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_measure, args=(func, path, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--from", dest="source", help="directory of .pdoc files to benchmark")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_pdoc_")
+    if args.source:
+        docs = sorted(Path(args.source).glob(f"*{DOC_SUFFIX}"))
+    else:
+        docs = []
+        for pages in (10, 300, 1000):
+            path = Path(workdir) / f"synthetic_{pages}{DOC_SUFFIX}"
+            make_synthetic(path, pages, seed=pages)
+            docs.append(path)
+
+    print(f"{'document':<28}{'operation':<11}{'json ms':>9}{'pdoc ms':>9}{'json RSS MiB':>14}{'pdoc RSS MiB':>14}")
+    for doc in docs:
+        json_path = export_json(doc, os.path.join(workdir, f"{doc.stem}.json"))
+        sizes = f"(json {os.path.getsize(json_path) / 1e6:.2f} MB, pdoc {os.path.getsize(doc) / 1e6:.2f} MB)"
+        print(f"{doc.name} {sizes}")
+        for name, (json_func, pdoc_func) in OPERATIONS.items():
+            json_time, json_rss, _ = measure(json_func, json_path)
+            pdoc_time, pdoc_rss, _ = measure(pdoc_func, str(doc))
+            print(f"{'':<28}{name:<11}{json_time * 1000:>9.2f}{pdoc_time * 1000:>9.2f}"
+                  f"{json_rss / 2**20:>14.2f}{pdoc_rss / 2**20:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,9 @@ cd /app/Back
 echo "Testing Django setup..."
 python manage.py check --deploy || echo "Django check failed, continuing anyway..."
 
+# Podcast audio is sent by Nginx (see /protected-media/ in the Nginx config), not by a Gunicorn worker
+export PODCAST_ACCEL_REDIRECT_PREFIX="${PODCAST_ACCEL_REDIRECT_PREFIX:-/protected-media/}"
+
 # Start Gunicorn with better configuration
 echo "Starting Gunicorn..."
 gunicorn Adobe.wsgi:application \
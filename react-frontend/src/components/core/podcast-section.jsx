@@ -1,5 +1,6 @@
 import React, { useState, useRef, useEffect } from "react";
 import { useSelector } from "react-redux";
+import toast from "react-hot-toast";
 import {
   X,
   Play,
@@ -44,16 +45,21 @@ export default function PodcastSectionsPanel({ onClose }) {
     const audio = audioRef.current;
     if (!audio) return;
 
-    const setAudioData = () => setDuration(audio.duration);
+    // A streamed podcast has no known duration until the last segment arrives
+    const setAudioData = () =>
+      setDuration(Number.isFinite(audio.duration) ? audio.duration : 0);
     const setAudioTime = () => setCurrentTime(audio.currentTime);
     const handlePlay = () => setIsPlaying(true);
     const handlePause = () => setIsPlaying(false);
+    const handleError = () => toast.error("Failed to generate podcast audio.");
 
     audio.addEventListener("loadeddata", setAudioData);
+    audio.addEventListener("durationchange", setAudioData);
     audio.addEventListener("timeupdate", setAudioTime);
     audio.addEventListener("play", handlePlay);
     audio.addEventListener("pause", handlePause);
     audio.addEventListener("ended", handlePause);
+    audio.addEventListener("error", handleError);
 
     if (podcastAudioUrl) {
       audio.play().catch((e) => console.error("Autoplay was prevented:", e));
@@ -61,10 +67,12 @@ export default function PodcastSectionsPanel({ onClose }) {
 
     return () => {
       audio.removeEventListener("loadeddata", setAudioData);
+      audio.removeEventListener("durationchange", setAudioData);
       audio.removeEventListener("timeupdate", setAudioTime);
       audio.removeEventListener("play", handlePlay);
       audio.removeEventListener("pause", handlePause);
       audio.removeEventListener("ended", handlePause);
+      audio.removeEventListener("error", handleError);
     };
   }, [podcastAudioUrl]);
 
@@ -2,7 +2,7 @@ import React, { useState, useRef } from "react";
 import { useSelector, useDispatch } from "react-redux";
 import toast from "react-hot-toast";
 import { UploadCloud, FileText, X, Loader2 } from "lucide-react";
-import { getSessionId } from "../../lib/utils";
+import { getSessionId, pollUntilReady, readEventStream } from "../../lib/utils";
 import Navbar from "./navbar";
 import AdobePDFViewer from "./pdf-view";
 import RelevantSectionsPanel from "./relevant-section";
@@ -291,7 +291,7 @@ export default function Workspace() {
       if (!response.ok) {
         throw new Error(`Server Error: ${response.status}`);
       }
-      toast.success("Documents are ready for analysis.");
+      toast.success("Documents uploaded. Parsing continues in the background.");
       setShowAnalysisView(true);
     } catch (error) {
       console.error("Error uploading documents:", error);
@@ -338,7 +338,7 @@ export default function Workspace() {
     try {
       const formData = new FormData();
       formData.append("selected_text", selectedText);
-      const response = await fetch("/api/find_relevant_sections/", {
+      const response = await fetch("/api/find_relevant_sections/stream/", {
         method: "POST",
         body: formData,
         headers: { "X-Session-Id": getSessionId() },
@@ -346,9 +346,28 @@ export default function Workspace() {
       if (!response.ok) {
         throw new Error(`Server Error: ${response.status}`);
       }
-      const data = await response.json();
-      console.log(data.extracted_sections);
-      dispatch(setRelevantSections(data.extracted_sections || []));
+      // Sections (with their locations) arrive before the summaries; show them right away
+      let sections = [];
+      let streamError = null;
+      await readEventStream(response, (event, data) => {
+        if (event === "sections" || event === "done") {
+          sections = data.extracted_sections || [];
+          dispatch(setRelevantSections(sections));
+          dispatch(setRelevantSectionsLoading(false));
+        } else if (event === "summary") {
+          sections = sections.map((section) =>
+            section.section_title === data.section_title
+              ? { ...section, refined_text: data.refined_text }
+              : section
+          );
+          dispatch(setRelevantSections(sections));
+        } else if (event === "error") {
+          streamError = data.error;
+        }
+      });
+      if (streamError) {
+        throw new Error(streamError);
+      }
       toast.success("Analysis complete!");
     } catch (error) {
       console.error("Error fetching relevant sections:", error);
@@ -382,14 +401,37 @@ export default function Workspace() {
     setActivePanel("insights");
 
     try {
-      const response = await fetch("/api/get_insights/", {
-        headers: { "X-Session-Id": getSessionId() },
-      });
-      if (!response.ok) {
-        throw new Error(`Server Error: ${response.status}`);
+      // Each category is shown as soon as it is complete
+      let insights = {};
+      let streamError = null;
+      // While the upload's insights job runs, the server ends the stream with "retry": attach again
+      for (;;) {
+        const response = await fetch("/api/get_insights/stream/", {
+          headers: { "X-Session-Id": getSessionId() },
+        });
+        if (!response.ok) {
+          throw new Error(`Server Error: ${response.status}`);
+        }
+        let retryAfter = 0;
+        await readEventStream(response, (event, data) => {
+          if (event === "category") {
+            insights = { ...insights, [data.category]: data.items };
+            dispatch(setInsights(insights));
+            dispatch(setInsightsLoading(false));
+          } else if (event === "done") {
+            dispatch(setInsights(data.results));
+          } else if (event === "error") {
+            streamError = data.error;
+          } else if (event === "retry") {
+            retryAfter = data.retry_after || 2;
+          }
+        });
+        if (!retryAfter) break;
+        await new Promise((resolve) => setTimeout(resolve, retryAfter * 1000));
+      }
+      if (streamError) {
+        throw new Error(streamError);
       }
-      const data = await response.json();
-      dispatch(setInsights(data));
       toast.success("Insights generated successfully!");
     } catch (error) {
       console.error("Error fetching insights:", error);
@@ -418,21 +460,21 @@ export default function Workspace() {
     dispatch(setPodcastAudioUrl(null));
     setActivePanel("podcast");
     try {
-      const response = await fetch("/api/generate_audio_podcast/", {
-        headers: { "X-Session-Id": getSessionId() },
-      });
-
+      // The audio element plays the streamed MP3 as it arrives, so playback starts
+      // after the first dialogue turns instead of after the whole episode is synthesised.
+      // Media elements cannot send headers, so the session goes in the query string.
+      const audioUrl = `/api/generate_audio_podcast/stream/?session_id=${encodeURIComponent(
+        getSessionId()
+      )}`;
+      // While the upload's job is still making the insights or the podcast the endpoint
+      // answers 202; poll it (HEAD, no audio downloaded) so the player only starts once
+      // it will get audio, and the server never synthesises a second copy.
+      const response = await pollUntilReady(audioUrl, { method: "HEAD" });
       if (!response.ok) {
-        const errorData = await response
-          .json()
-          .catch(() => ({ detail: "Failed to generate podcast audio." }));
-        throw new Error(errorData.detail || `Server Error: ${response.status}`);
+        throw new Error(`Server Error: ${response.status}`);
       }
-
-      const audioBlob = await response.blob();
-      const audioUrl = URL.createObjectURL(audioBlob);
       dispatch(setPodcastAudioUrl(audioUrl));
-      toast.success("Podcast generated successfully!");
+      toast.success("Podcast is starting...");
     } catch (error) {
       console.error("Error fetching podcast:", error);
       toast.error(error.message);
@@ -20,4 +20,46 @@ export function getSessionId() {
     sessionStorage.setItem('session_id', sessionId);
   }
   return sessionId;
-}
\ No newline at end of file
+}
+// Reads a Server-Sent Events response body (from fetch, so POST works too),
+// calling onEvent(event, data) with the parsed JSON of each message as it arrives.
+export async function readEventStream(response, onEvent) {
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+      const message = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      let event = "message";
+      const data = [];
+      for (const line of message.split("\n")) {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) data.push(line.slice(5).trim());
+      }
+      if (data.length) onEvent(event, JSON.parse(data.join("\n")));
+    }
+  }
+}
+
+// Requests a long-poll endpoint until it stops answering 202 Accepted (work still in progress).
+// Each request waits up to `wait` seconds server-side; onProgress(data) gets every 202 body
+// (HEAD responses have none). Resolves with the final response, checked like any fetch response.
+export async function pollUntilReady(url, { method = "GET", headers = {}, wait = 10, onProgress } = {}) {
+  const separator = url.includes("?") ? "&" : "?";
+  for (;;) {
+    const response = await fetch(`${url}${separator}wait=${wait}`, { method, headers });
+    if (response.status !== 202) return response;
+    const progress = method === "HEAD" ? null : await response.json();
+    if (onProgress) onProgress(progress);
+    // wait=0 answers right away; back off as the server suggests instead of spinning
+    if (!wait) {
+      const retryAfter = Number(response.headers.get("Retry-After")) || 2;
+      await new Promise((resolve) => setTimeout(resolve, retryAfter * 1000));
+    }
+  }
+}